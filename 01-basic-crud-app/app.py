@@ -44,12 +44,40 @@ How to run:
 Then open http://127.0.0.1:5000/
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, Response, render_template, request, redirect, url_for, session, stream_template
+from markupsafe import Markup, escape  # Installed with Flask; used to safely highlight search matches
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import csv
+import io
+import json
+import re
 import sqlite3  # Built-in Python module for SQLite databases
+import threading
+import time
 
 # Name of our SQLite database file (will be created on first run)
 DB_NAME = "database.db"
 
+# How many items the home page shows at once.
+# Visitors can ask for a different size with ?per_page=..., up to MAX_ITEMS_PER_PAGE.
+ITEMS_PER_PAGE = 50
+MAX_ITEMS_PER_PAGE = 500
+
+# Item cache settings: how many items to remember, and for how many seconds.
+ITEM_CACHE_SIZE = 1000
+ITEM_CACHE_TTL = 300
+
+# How many contact messages and users the admin dashboard shows per page.
+ADMIN_PAGE_SIZE = 25
+
+# How many suggestions /autocomplete returns (visitors can ask for up to the maximum with ?limit=).
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+# Bulk import saves this many rows per transaction (one commit per batch, not per row).
+IMPORT_BATCH_SIZE = 5000
+
 # Create the Flask application instance
 app = Flask(__name__)
 app.secret_key = "your_secret_key_here"  # Needed for session management
@@ -65,22 +93,256 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+class LRUCache:
+    """
+    A small in-memory cache that remembers the most recently used values.
+
+    How it works:
+    - An OrderedDict keeps the keys in the order they were last used.
+    - get() moves a key to the end, so the least recently used key is always first.
+    - When the cache is full, set() throws away that first (oldest) key.
+    - Every value also has an expiry time, so nothing is kept longer than ttl seconds.
+
+    hits and misses count how often get() found a value, so we can tell
+    whether max_size is big enough.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # Flask can handle several requests at once, so only one may change the cache at a time.
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Store value under key, removing the least recently used key if the cache is full."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Forget key (used when the data behind it changes)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        """Return the counters as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+# item_cache remembers database rows; page_cache remembers finished view.html pages.
+item_cache = LRUCache(ITEM_CACHE_SIZE, ITEM_CACHE_TTL)
+page_cache = LRUCache(ITEM_CACHE_SIZE, ITEM_CACHE_TTL)
+
+def get_item(item_id):
+    """
+    Return one item row, reading it from item_cache when we can.
+
+    This is a "read-through" cache: on a miss we read the database and
+    save the row in the cache so the next request doesn't have to.
+    """
+    item = item_cache.get(item_id)
+    if item is None:
+        conn = get_db_connection()
+        item = conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
+        conn.close()
+        if item is not None:
+            item_cache.set(item_id, item)
+    return item
+
+def forget_item(item_id):
+    """Remove one item from both caches after it is edited or deleted."""
+    item_cache.delete(item_id)
+    page_cache.delete(item_id)
+
+class NameIndex:
+    """
+    An in-memory list of item names for type-ahead suggestions.
+
+    How it works:
+    - Every word of every item name is stored as (word, item_id) in ONE sorted list.
+      The whole name is stored too, so "red ap" can match "Red Apple".
+    - Because the list is sorted, all words starting with "ap" sit next to each other.
+      bisect_left() finds the first one in about 20 steps, even with a million entries
+      (it halves the list each step, like guessing a number between 1 and 1,000,000).
+    - We then walk forward until the words stop starting with "ap".
+
+    Keeping it up to date:
+    - The list is built from the database the first time someone asks for suggestions.
+    - create(), edit() and delete() call add() and remove(), so we never rebuild it for one change.
+    - Bulk imports call reset(), which throws the list away so it is rebuilt on next use.
+    """
+
+    def __init__(self):
+        self._keys = []     # sorted list of (lowercase word or name, item_id)
+        self._names = {}    # item_id -> name, so we can show the name and find old keys on remove
+        self._built = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys_for(name):
+        """Return the lowercase search keys for one name: the full name plus each word."""
+        lowered = name.casefold()
+        return {lowered} | set(lowered.split())
+
+    def _build(self):
+        """Load every item name from the database (called with the lock held)."""
+        conn = get_db_connection()
+        rows = conn.execute("SELECT id, name FROM items").fetchall()
+        conn.close()
+        self._names = {row["id"]: row["name"] for row in rows}
+        self._keys = sorted(
+            (key, item_id) for item_id, name in self._names.items() for key in self._keys_for(name)
+        )
+        self._built = True
+
+    def add(self, item_id, name):
+        """Add one item (or replace its old name)."""
+        with self._lock:
+            if not self._built:
+                return  # It will be loaded from the database when first used.
+            self._remove_locked(item_id)
+            self._names[item_id] = name
+            for key in self._keys_for(name):
+                insort(self._keys, (key, item_id))
+
+    def remove(self, item_id):
+        """Remove one item."""
+        with self._lock:
+            if self._built:
+                self._remove_locked(item_id)
+
+    def _remove_locked(self, item_id):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for key in self._keys_for(name):
+            position = bisect_left(self._keys, (key, item_id))
+            if position < len(self._keys) and self._keys[position] == (key, item_id):
+                del self._keys[position]
+
+    def reset(self):
+        """Forget everything; the next complete() rebuilds from the database."""
+        with self._lock:
+            self._keys = []
+            self._names = {}
+            self._built = False
+
+    def complete(self, prefix, limit):
+        """Return up to limit items whose name (or a word in it) starts with prefix."""
+        prefix = prefix.casefold()
+        results = []
+        seen = set()
+        with self._lock:
+            if not self._built:
+                self._build()
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, item_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if item_id not in seen:
+                    seen.add(item_id)
+                    results.append({"id": item_id, "name": self._names[item_id]})
+                position += 1
+        return results
+
+name_index = NameIndex()
+
+def iter_items(after_id=0):
+    """
+    Yield item rows one at a time, oldest first, starting after after_id.
+
+    Why a generator?
+    - fetchall() copies every row into a Python list before the page can start.
+    - Looping over the cursor hands out one row at a time, so memory stays small
+      even when the table has millions of rows.
+    - The connection is closed in "finally", even if the browser disconnects halfway.
+    """
+    conn = get_db_connection()
+    try:
+        for row in conn.execute("SELECT * FROM items WHERE id > ? ORDER BY id", (after_id,)):
+            yield row
+    finally:
+        conn.close()
+
 @app.route("/")
 def index():
     """
-    HOME PAGE (READ): Show a list of all items in the database.
-    - SQL: SELECT * FROM items
+    HOME PAGE (READ): Show one page of items from the database.
+    - SQL: SELECT * FROM items WHERE id > ? ORDER BY id LIMIT ?
     - Template: templates/index.html
-    
+
+    KEYSET PAGINATION:
+    - Instead of "skip the first 10,000 rows" (OFFSET), we remember the id of the last item
+      on the page and ask for items with a bigger id: /?after=<last id>
+    - The id column is the primary key, so SQLite jumps straight to the right row.
+      Page 1 and page 10,000 are equally fast.
+    - We ask for one extra row so we know whether a "Next page" link is needed.
+
+    STREAMING MODE (/?stream=1):
+    - Shows every item, but sends the HTML to the browser while the rows are still being read.
+    - stream_template() renders with stream_with_context(), so request and session
+      still work inside the template while it streams.
+
     JINJA TEMPLATING EXAMPLE:
     - We pass 'items' variable to the template: render_template("index.html", items=items)
     - In the template, we can access this as {{ items }} or loop through it with {% for item in items %}
     - Each 'item' is a database row that we can access like item['name'], item['description']
     """
+    after_id = request.args.get("after", 0, type=int)
+
+    if request.args.get("stream"):
+        return stream_template("index.html", items=iter_items(after_id), streaming=True)
+
+    per_page = request.args.get("per_page", ITEMS_PER_PAGE, type=int)
+    per_page = max(1, min(per_page, MAX_ITEMS_PER_PAGE))
+
     conn = get_db_connection()
-    items = conn.execute("SELECT * FROM items").fetchall()
+    items = conn.execute(
+        "SELECT * FROM items WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, per_page + 1)
+    ).fetchall()
     conn.close()
-    return render_template("index.html", items=items)
+
+    # If we got the extra row, there is another page after this one.
+    next_after = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_after = items[-1]["id"]
+
+    return render_template(
+        "index.html",
+        items=items,
+        after_id=after_id,
+        per_page=per_page,
+        next_after=next_after,
+        streaming=False
+    )
 
 @app.route("/create/", methods=("GET", "POST"))
 def create():
@@ -105,12 +367,14 @@ def create():
             return redirect(url_for("create"))
 
         conn = get_db_connection()
-        conn.execute(
+        cursor = conn.execute(
             "INSERT INTO items (name, description) VALUES (?, ?)",
             (name, description)
         )
         conn.commit()
         conn.close()
+        # cursor.lastrowid is the id SQLite just gave the new item.
+        name_index.add(cursor.lastrowid, name)
 
         # After saving, go back to the list page
         return redirect(url_for("index"))
@@ -130,12 +394,10 @@ def edit(item_id):
     - In edit.html, we can pre-fill form fields like: value="{{ item['name'] }}"
     - This allows users to see and modify existing data instead of starting with empty fields
     """
-    conn = get_db_connection()
-    item = conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
+    item = get_item(item_id)
 
     if not item:
         # If item doesn't exist, go back to the list (basic handling for beginners)
-        conn.close()
         return redirect(url_for("index"))
 
     if request.method == "POST":
@@ -143,16 +405,19 @@ def edit(item_id):
         new_description = request.form["description"].strip()
 
         if new_name and new_description:
+            conn = get_db_connection()
             conn.execute(
                 "UPDATE items SET name = ?, description = ? WHERE id = ?",
                 (new_name, new_description, item_id)
             )
             conn.commit()
+            conn.close()
+            # The cached copies now show old data, so throw them away.
+            forget_item(item_id)
+            name_index.add(item_id, new_name)
 
-        conn.close()
         return redirect(url_for("index"))
 
-    conn.close()
     # Show the form with existing values
     return render_template("edit.html", item=item)
 
@@ -165,15 +430,116 @@ def delete(item_id):
     conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
     conn.commit()
     conn.close()
+    forget_item(item_id)
+    name_index.remove(item_id)
     return redirect(url_for("index"))
 
+def create_items_table():
+    """
+    Create the items table if it doesn't exist.
+    """
+    conn = get_db_connection()
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+def create_search_index():
+    """
+    Create the items_fts full-text search index if it doesn't exist.
+
+    Why a search index?
+    - "name LIKE '%apple%'" has to read EVERY row of items, so it gets slower as the table grows.
+    - An FTS5 table works like the index at the back of a book: it maps each word to the
+      rows that contain it, so looking up a word stays fast no matter how many items we have.
+
+    How it stays up to date:
+    - items_fts is an "external content" table: it stores only the index, the text stays in items.
+    - Three triggers copy every INSERT, UPDATE and DELETE on items into the index automatically,
+      so create(), edit() and delete() don't need to know the index exists.
+    """
+    conn = get_db_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'"
+    ).fetchone()
+    conn.executescript(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            name, description,
+            content='items', content_rowid='id',
+            prefix='2 3'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO items_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END;
+        """
+    )
+    if not exists:
+        # First run: index the items that were saved before the search index existed.
+        conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+
+# Characters FTS5 puts around matching words in snippet() output.
+# They are control characters nobody types, so we can find them again after escaping the text.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+def build_fts_query(query):
+    """
+    Turn what the user typed into a safe FTS5 query.
+
+    - Each word is wrapped in double quotes so characters like - or : are not treated as operators.
+    - Each word gets a * so "app" also finds "apple" (a prefix query, good for type-as-you-go).
+    - Words are joined with spaces, which FTS5 reads as AND.
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+def highlight(text):
+    """
+    Escape a snippet for HTML and wrap the matched words in <mark> tags.
+
+    We escape FIRST so any HTML typed into an item can't run in the page,
+    then swap our marker characters for real <mark> tags.
+    """
+    safe_text = str(escape(text))
+    safe_text = safe_text.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+    return Markup(safe_text)
+
 @app.route("/search")
 def search():
     """
-    SEARCH: Find items whose name or description contains the query string.
-    - SQL: SELECT * FROM items WHERE name LIKE ? OR description LIKE ?
+    SEARCH: Find items whose name or description contains the query words.
+    - SQL: SELECT ... FROM items_fts WHERE items_fts MATCH ? ORDER BY bm25(items_fts)
     - Template: templates/search_results.html
-    
+
+    HOW THE RANKING WORKS:
+    - bm25() gives every match a score; smaller is a better match.
+    - Matches in the name count 10 times more than matches in the description.
+    - snippet() returns a short piece of the description around the matching words.
+
     JINJA TEMPLATING EXAMPLE:
     - We pass TWO variables: query (the search term) and results (the found items)
     - render_template("search_results.html", query=query, results=results)
@@ -182,14 +548,30 @@ def search():
     """
     query = request.args.get("q", "").strip()
     results = []
-    if query:
+    fts_query = build_fts_query(query)
+    if fts_query:
         conn = get_db_connection()
-        like_query = f"%{query}%"
-        results = conn.execute(
-            "SELECT * FROM items WHERE name LIKE ? OR description LIKE ?",
-            (like_query, like_query)
+        rows = conn.execute(
+            """
+            SELECT items.id,
+                   items.name,
+                   items.description,
+                   highlight(items_fts, 0, ?, ?) AS name_highlight,
+                   snippet(items_fts, 1, ?, ?, '...', 12) AS description_snippet
+            FROM items_fts
+            JOIN items ON items.id = items_fts.rowid
+            WHERE items_fts MATCH ?
+            ORDER BY bm25(items_fts, 10.0, 1.0)
+            LIMIT 50
+            """,
+            (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, fts_query)
         ).fetchall()
         conn.close()
+        for row in rows:
+            item = dict(row)
+            item["name_highlight"] = highlight(row["name_highlight"])
+            item["description_snippet"] = highlight(row["description_snippet"])
+            results.append(item)
     return render_template("search_results.html", query=query, results=results)
 
 @app.route("/<int:item_id>/")
@@ -203,13 +585,155 @@ def view(item_id):
     - We pass a single 'item' variable: render_template("view.html", item=item)
     - In the template, we can access item properties: {{ item['name'] }}, {{ item['description'] }}
     - This is useful for showing detailed information about one specific record
+
+    CACHING:
+    - The row comes from get_item(), so popular items are read from memory.
+    - For visitors who are not logged in every page looks the same, so we also keep the
+      finished HTML in page_cache. Logged-in users see their name in the navbar,
+      so their pages are always rendered fresh.
     """
-    conn = get_db_connection()
-    item = conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
-    conn.close()
+    logged_in = bool(session.get("user_id"))
+    if not logged_in:
+        html = page_cache.get(item_id)
+        if html is not None:
+            return html
+
+    item = get_item(item_id)
     if item is None:
         return render_template("404.html"), 404
-    return render_template("view.html", item=item)
+    html = render_template("view.html", item=item)
+    if not logged_in:
+        page_cache.set(item_id, html)
+    return html
+
+@app.route("/autocomplete")
+def autocomplete():
+    """
+    AUTOCOMPLETE: Return item names that start with what the user has typed so far, as JSON.
+    - Example: /autocomplete?q=app -> {"query": "app", "results": [{"id": 1, "name": "Apple"}]}
+    - Uses name_index (in memory), so typing in the search box never touches SQLite.
+    - The search box in base.html calls this while the user types.
+    """
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", AUTOCOMPLETE_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+    results = name_index.complete(query, limit) if query else []
+    return {"query": query, "results": results}
+
+def read_import_rows(upload, file_format):
+    """
+    Yield (name, description) pairs from an uploaded CSV or JSONL file, one line at a time.
+
+    Why not read the whole file?
+    - upload.stream is a file object, so we can loop over it line by line.
+    - Only the current line is in memory, even if the file is hundreds of megabytes.
+    - Rows with a missing name or description are skipped (yielded as None so we can count them).
+    """
+    text = io.TextIOWrapper(upload.stream, encoding="utf-8", newline="")
+    if file_format == "csv":
+        records = csv.DictReader(text)
+    else:
+        records = (json.loads(line) for line in text if line.strip())
+    for record in records:
+        if not isinstance(record, dict):
+            yield None
+            continue
+        name = str(record.get("name") or "").strip()
+        description = str(record.get("description") or "").strip()
+        yield (name, description) if name and description else None
+
+@app.route("/import", methods=("GET", "POST"))
+def import_items():
+    """
+    BULK IMPORT: Upload a CSV or JSONL file of items (admin only).
+    - CSV needs a header row with name and description columns.
+    - JSONL is one JSON object per line: {"name": "...", "description": "..."}
+    - Template: templates/import.html
+
+    WHY THIS IS FAST:
+    - executemany() sends a whole batch of rows to SQLite in one call.
+    - We commit once per IMPORT_BATCH_SIZE rows instead of once per row.
+      Each commit waits for the disk, so fewer commits means much faster imports.
+    """
+    if not session.get("user_id") or session.get("status") != "admin":
+        return redirect(url_for("login"))
+
+    imported = None
+    skipped = 0
+    error = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        file_format = request.form.get("format", "")
+        if not upload or upload.filename == "":
+            error = "Please choose a file to upload."
+        elif file_format not in ("csv", "jsonl"):
+            error = "Format must be CSV or JSONL."
+        else:
+            imported = 0
+            batch = []
+            conn = get_db_connection()
+            try:
+                for row in read_import_rows(upload, file_format):
+                    if row is None:
+                        skipped += 1
+                        continue
+                    batch.append(row)
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        conn.executemany("INSERT INTO items (name, description) VALUES (?, ?)", batch)
+                        conn.commit()
+                        imported += len(batch)
+                        batch = []
+                if batch:
+                    conn.executemany("INSERT INTO items (name, description) VALUES (?, ?)", batch)
+                    conn.commit()
+                    imported += len(batch)
+            except (ValueError, csv.Error) as e:
+                # Batches saved before the bad line stay saved; tell the user where we stopped.
+                conn.rollback()
+                error = f"Could not read the file after {imported} items: {e}"
+            finally:
+                conn.close()
+                # Thousands of new names: cheaper to rebuild the suggestion list once than add one by one.
+                name_index.reset()
+    return render_template("import.html", imported=imported, skipped=skipped, error=error)
+
+@app.route("/export/<file_format>")
+def export_items(file_format):
+    """
+    BULK EXPORT: Download every item as CSV or JSONL (admin only).
+
+    The response body is a generator: each row is turned into one line of text
+    and sent right away, so the whole file is never built in memory.
+    """
+    if not session.get("user_id") or session.get("status") != "admin":
+        return redirect(url_for("login"))
+    if file_format not in ("csv", "jsonl"):
+        return redirect(url_for("import_items"))
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "name", "description"])
+        for item in iter_items():
+            writer.writerow([item["id"], item["name"], item["description"]])
+            # Send what the writer produced so far, then empty the buffer for the next row.
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    def generate_jsonl():
+        for item in iter_items():
+            yield json.dumps(dict(item)) + "\n"
+
+    if file_format == "csv":
+        body, mimetype = generate_csv(), "text/csv"
+    else:
+        body, mimetype = generate_jsonl(), "application/x-ndjson"
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=items.{file_format}"}
+    )
 
 @app.route("/about")
 def about():
@@ -361,15 +885,69 @@ def logout():
     session.clear()
     return render_template("logout.html")
 
+def create_dashboard_indexes():
+    """
+    Create the index and row counters used by the admin dashboard.
+
+    - idx_contact_messages_created_at lets "ORDER BY created_at DESC" read the newest
+      messages straight from the index instead of sorting the whole table.
+    - table_counts stores how many rows contact_messages and users have.
+      Triggers add or subtract 1 on every INSERT and DELETE, so the dashboard reads one
+      number instead of running COUNT(*), which has to look at every row.
+    """
+    conn = get_db_connection()
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_contact_messages_created_at
+            ON contact_messages (created_at);
+
+        CREATE TABLE IF NOT EXISTS table_counts (
+            name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        );
+
+        -- Count the rows that already exist (only the first time; OR IGNORE skips it later).
+        INSERT OR IGNORE INTO table_counts (name, row_count)
+            SELECT 'contact_messages', COUNT(*) FROM contact_messages;
+        INSERT OR IGNORE INTO table_counts (name, row_count)
+            SELECT 'users', COUNT(*) FROM users;
+
+        CREATE TRIGGER IF NOT EXISTS contact_messages_count_insert AFTER INSERT ON contact_messages BEGIN
+            UPDATE table_counts SET row_count = row_count + 1 WHERE name = 'contact_messages';
+        END;
+        CREATE TRIGGER IF NOT EXISTS contact_messages_count_delete AFTER DELETE ON contact_messages BEGIN
+            UPDATE table_counts SET row_count = row_count - 1 WHERE name = 'contact_messages';
+        END;
+        CREATE TRIGGER IF NOT EXISTS users_count_insert AFTER INSERT ON users BEGIN
+            UPDATE table_counts SET row_count = row_count + 1 WHERE name = 'users';
+        END;
+        CREATE TRIGGER IF NOT EXISTS users_count_delete AFTER DELETE ON users BEGIN
+            UPDATE table_counts SET row_count = row_count - 1 WHERE name = 'users';
+        END;
+        """
+    )
+    conn.commit()
+    conn.close()
+
 @app.route("/admin")
 def admin_dashboard():
     """
     ADMIN DASHBOARD: Only accessible to admin users.
-    Shows contact messages and user management.
-    
+    Shows contact messages and user management, one page of each at a time.
+
+    CURSOR PAGINATION:
+    - Messages are newest first. The "Older messages" link remembers the created_at and id
+      of the last message shown (?msg_time=...&msg_id=...) and asks for messages before it.
+      We compare (created_at, id) together because two messages can share the same second.
+    - Users are sorted by username, which is UNIQUE, so ?user_after=<last username> is enough.
+    - Each list keeps the other list's cursor in its links, so paging one doesn't reset the other.
+
+    The totals in the summary header come from table_counts (see create_dashboard_indexes()),
+    so nothing on this page has to read every row.
+
     JINJA TEMPLATING EXAMPLE:
-    - We pass TWO variables: messages and users
-    - render_template("admin_dashboard.html", messages=messages, users=users)
+    - We pass the two lists plus the totals and the cursors for the "next page" links
+    - render_template("admin_dashboard.html", messages=messages, users=users, ...)
     - In the template, we can loop through both:
     - {% for message in messages %} to show contact messages
     - {% for user in users %} to show user list
@@ -377,11 +955,71 @@ def admin_dashboard():
     """
     if not session.get("user_id") or session.get("status") != "admin":
         return redirect(url_for("login"))
+
+    msg_time = request.args.get("msg_time", "")
+    msg_id = request.args.get("msg_id", 0, type=int)
+    user_after = request.args.get("user_after", "")
+
     conn = get_db_connection()
-    messages = conn.execute("SELECT * FROM contact_messages ORDER BY created_at DESC").fetchall()
-    users = conn.execute("SELECT * FROM users ORDER BY username ASC").fetchall()
+    if msg_time:
+        messages = conn.execute(
+            """
+            SELECT * FROM contact_messages
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC LIMIT ?
+            """,
+            (msg_time, msg_id, ADMIN_PAGE_SIZE + 1)
+        ).fetchall()
+    else:
+        messages = conn.execute(
+            "SELECT * FROM contact_messages ORDER BY created_at DESC, id DESC LIMIT ?",
+            (ADMIN_PAGE_SIZE + 1,)
+        ).fetchall()
+    users = conn.execute(
+        "SELECT * FROM users WHERE username > ? ORDER BY username ASC LIMIT ?",
+        (user_after, ADMIN_PAGE_SIZE + 1)
+    ).fetchall()
+    counts = dict(conn.execute("SELECT name, row_count FROM table_counts").fetchall())
     conn.close()
-    return render_template("admin_dashboard.html", messages=messages, users=users)
+
+    # We asked for one extra row; if it came back, there is another page.
+    # Each "next page" link moves its own cursor forward and keeps the other list's cursor.
+    msg_cursor = {"msg_time": msg_time, "msg_id": msg_id} if msg_time else {}
+    user_cursor = {"user_after": user_after} if user_after else {}
+    next_messages_url = None
+    if len(messages) > ADMIN_PAGE_SIZE:
+        messages = messages[:ADMIN_PAGE_SIZE]
+        next_messages_url = url_for(
+            "admin_dashboard",
+            msg_time=messages[-1]["created_at"],
+            msg_id=messages[-1]["id"],
+            **user_cursor
+        )
+    next_users_url = None
+    if len(users) > ADMIN_PAGE_SIZE:
+        users = users[:ADMIN_PAGE_SIZE]
+        next_users_url = url_for("admin_dashboard", user_after=users[-1]["username"], **msg_cursor)
+
+    return render_template(
+        "admin_dashboard.html",
+        messages=messages,
+        users=users,
+        total_messages=counts.get("contact_messages", 0),
+        total_users=counts.get("users", 0),
+        next_messages_url=next_messages_url,
+        next_users_url=next_users_url
+    )
+
+@app.route("/admin/cache")
+def cache_stats():
+    """
+    CACHE STATS: Show hit/miss counters for the item caches as JSON (admin only).
+    - A low hit_rate with size == max_size means ITEM_CACHE_SIZE is too small.
+    - Flask turns a returned dictionary into a JSON response automatically.
+    """
+    if not session.get("user_id") or session.get("status") != "admin":
+        return redirect(url_for("login"))
+    return {"items": item_cache.stats(), "pages": page_cache.stats()}
 
 @app.route("/admin/user/<int:user_id>/edit/", methods=("GET", "POST"))
 def edit_user(user_id):
@@ -430,20 +1068,11 @@ def edit_user(user_id):
 
 if __name__ == "__main__":
     # On startup: create the database tables if they don't exist.
-    conn = get_db_connection()
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT NOT NULL
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
+    create_items_table()
     create_contact_table()
     create_users_table()
+    create_search_index()
+    create_dashboard_indexes()
 
     # Start the Flask development server
     # debug=True auto-reloads when you save changes; great for learning.
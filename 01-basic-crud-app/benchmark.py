@@ -0,0 +1,261 @@
+"""
+benchmark.py: Measure how fast the CRUD app's pages are with lots of data.
+
+What it does:
+1. Builds a fresh SQLite database filled with fake items, users and contact messages
+   (10,000, 100,000 and 1,000,000 rows of each by default).
+2. Sends many requests to index, search, view, create and login at the same time,
+   from several worker threads, using Flask's test client (no web server needed).
+3. Prints the p50/p95/p99 latency and requests per second for every page.
+
+What do p50, p95 and p99 mean?
+- p50: half of the requests were faster than this (the "typical" request).
+- p95: 95 out of 100 requests were faster than this.
+- p99: only 1 request in 100 was slower than this (the "unlucky" request).
+
+Spotting regressions:
+- Save a run with --save baseline.json before you change the code.
+- Run again with --compare baseline.json. The script exits with an error if any page's
+  p95 got more than --tolerance (default 25%) slower, so you notice before deploying.
+
+How to run:
+    python benchmark.py                                  # 10k, 100k and 1M rows (1M takes a while)
+    python benchmark.py --sizes 10000 --requests 200     # quick check
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json
+
+By default the data goes into benchmark.db so your real database.db is left alone.
+Use --db database.db if you really want to fill the real database.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import app as crud_app
+
+# Words used to build fake item names, descriptions and messages.
+WORDS = (
+    "apple banana cherry grape lemon mango orange peach pear plum "
+    "red green blue yellow purple small large fresh sweet sour "
+    "book pencil laptop phone chair table lamp bottle backpack notebook"
+).split()
+
+# Every benchmark user gets this password, so the login test knows what to send.
+PASSWORD = "benchmark"
+
+# The pages we measure, in the order they are printed.
+ROUTES = ("index", "search", "view", "create", "login")
+
+# Rows are written in batches of this size (one transaction per batch).
+SEED_BATCH_SIZE = 10000
+
+
+def fake_text(rng, word_count):
+    """Return word_count random words joined with spaces."""
+    return " ".join(rng.choice(WORDS) for _ in range(word_count))
+
+
+def batched(rows, size):
+    """Split a stream of rows into lists of at most size rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_database(db_path, size, rng):
+    """
+    Delete db_path and rebuild it with size items, users and contact messages.
+
+    The tables, indexes and triggers are created by the same functions app.py uses,
+    so the benchmark always measures the real schema.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    crud_app.DB_NAME = db_path
+    crud_app.create_items_table()
+    crud_app.create_contact_table()
+    crud_app.create_users_table()
+    crud_app.create_search_index()
+    crud_app.create_dashboard_indexes()
+
+    conn = crud_app.get_db_connection()
+    items = ((fake_text(rng, 2), fake_text(rng, 12)) for _ in range(size))
+    for batch in batched(items, SEED_BATCH_SIZE):
+        conn.executemany("INSERT INTO items (name, description) VALUES (?, ?)", batch)
+        conn.commit()
+    users = ((f"user{i}", PASSWORD, "admin" if i == 0 else "guest") for i in range(size))
+    for batch in batched(users, SEED_BATCH_SIZE):
+        conn.executemany("INSERT INTO users (username, password, status) VALUES (?, ?, ?)", batch)
+        conn.commit()
+    messages = ((f"Visitor {i}", f"visitor{i}@example.com", fake_text(rng, 20)) for i in range(size))
+    for batch in batched(messages, SEED_BATCH_SIZE):
+        conn.executemany("INSERT INTO contact_messages (name, email, message) VALUES (?, ?, ?)", batch)
+        conn.commit()
+    conn.close()
+
+    # Start every size with empty caches so earlier runs don't make this one look faster.
+    crud_app.item_cache = crud_app.LRUCache(crud_app.ITEM_CACHE_SIZE, crud_app.ITEM_CACHE_TTL)
+    crud_app.page_cache = crud_app.LRUCache(crud_app.ITEM_CACHE_SIZE, crud_app.ITEM_CACHE_TTL)
+
+
+def send_request(client, route, size, rng):
+    """Send one request for route and return the response."""
+    if route == "index":
+        return client.get("/")
+    if route == "search":
+        return client.get("/search", query_string={"q": rng.choice(WORDS)})
+    if route == "view":
+        return client.get(f"/{rng.randint(1, size)}/")
+    if route == "create":
+        return client.post("/create/", data={"name": fake_text(rng, 2), "description": fake_text(rng, 12)})
+    # login
+    return client.post("/login", data={"username": f"user{rng.randrange(size)}", "password": PASSWORD})
+
+
+def run_route(route, size, total_requests, workers, seed):
+    """
+    Send total_requests requests to one route from several threads at once.
+
+    Returns a list of latencies (seconds) and the wall-clock time of the whole run.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_worker = [total_requests // workers + (1 if i < total_requests % workers else 0) for i in range(workers)]
+
+    def worker(count, worker_seed):
+        # Each thread gets its own test client and random generator; they are not shared.
+        client = crud_app.app.test_client()
+        rng = random.Random(worker_seed)
+        mine = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = send_request(client, route, size, rng)
+            # Reading the body makes streamed responses finish before we stop the clock.
+            response.get_data()
+            mine.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(count, seed + i)) for i, count in enumerate(per_worker)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        print(f"  warning: {len(errors)} {route} requests returned a server error", file=sys.stderr)
+    return latencies, elapsed
+
+
+def percentile(sorted_values, percent):
+    """Return the value below which percent% of sorted_values fall (nearest-rank method)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, elapsed):
+    """Turn raw latencies into the numbers we report (milliseconds and requests/second)."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def print_table(size, results):
+    """Print one size's results as a small text table."""
+    print(f"\n{size:,} rows per table")
+    print(f"  {'route':<8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'req/s':>10}")
+    for route in ROUTES:
+        r = results[route]
+        print(f"  {route:<8} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['p99_ms']:>10} {r['rps']:>10}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare p95 latencies against a saved baseline.
+
+    Returns a list of human-readable problems (empty if nothing got slower).
+    """
+    problems = []
+    for size, routes in results.items():
+        for route, current in routes.items():
+            before = baseline.get(size, {}).get(route)
+            if not before or not before["p95_ms"]:
+                continue
+            change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            if change > tolerance:
+                problems.append(
+                    f"{route} at {int(size):,} rows: p95 {before['p95_ms']} ms -> {current['p95_ms']} ms "
+                    f"({change:+.0%})"
+                )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the CRUD app with synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="rows per table to test with (default: 10000 100000 1000000)")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per route (default: 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent worker threads (default: 8)")
+    parser.add_argument("--db", default="benchmark.db", help="database file to fill (default: benchmark.db)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, so runs are repeatable")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="fail if p95 is slower than in this saved JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p95 slow-down when comparing, as a fraction (default: 0.25)")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        print(f"Seeding {args.db} with {size:,} items, users and contact messages...", flush=True)
+        started = time.perf_counter()
+        seed_database(args.db, size, rng)
+        print(f"  done in {time.perf_counter() - started:.1f}s", flush=True)
+
+        results[str(size)] = {}
+        for route in ROUTES:
+            latencies, elapsed = run_route(route, size, args.requests, args.workers, args.seed)
+            results[str(size)][route] = summarize(latencies, elapsed)
+        print_table(size, results[str(size)])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print("\nSlower than the baseline:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\nNo route is more than {args.tolerance:.0%} slower than {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,10 +16,27 @@ Learning Objectives:
 - RESTful API design principles
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, g, has_app_context
+from markupsafe import Markup, escape
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
+from email import policy as email_policy
+from email.parser import BytesParser
+from email.header import decode_header, make_header
+from email.utils import parseaddr, parsedate_to_datetime
+import base64
+import hashlib
+import heapq
+import html
+import json
+import math
 import os
+import queue
+import re
+import secrets
+import struct
+import threading
+import time
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -28,12 +45,975 @@ app.secret_key = "helpdesk_secret_key_2024"
 # Database configuration
 DB_NAME = "helpdesk.db"
 
+# When True, dashboard ticket counts are read from the ticket_counters table,
+# which triggers keep up to date. When False, they are counted from tickets on every page load.
+USE_TICKET_COUNTERS = True
+
+# Logged-in users are cached in memory for this many seconds (and at most USER_CACHE_SIZE of them)
+# so most requests don't have to look the user up in the database again.
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 1000
+
+# How many tickets /tickets shows per page (and the most a JSON client may ask for)
+TICKETS_PER_PAGE = 25
+MAX_TICKETS_PER_PAGE = 200
+
+# Most tickets /tickets/search returns, best matches first
+SEARCH_RESULTS_LIMIT = 50
+
+# Characters FTS5 puts around matched words in snippets; nobody types them, so after
+# escaping the text we can safely turn them into <mark> tags
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# view_ticket() shows only the newest responses; older ones load in pages of this size
+RESPONSES_PER_PAGE = 20
+
+# Live ticket feed (Server-Sent Events): how many undelivered events one browser may have
+# waiting, and how often to send a keep-alive comment so proxies don't close an idle stream.
+EVENT_QUEUE_SIZE = 100
+SSE_KEEPALIVE_SECONDS = 15
+
+# Automatic assignment: new tickets go to the least busy agent when this is True.
+# An agent's load is the sum of these weights over their open and in_progress tickets,
+# so one critical ticket counts as much as five low ones.
+AUTO_ASSIGN_TICKETS = True
+PRIORITY_WEIGHTS = {'low': 1, 'medium': 2, 'high': 3, 'critical': 5}
+ACTIVE_STATUSES = ('open', 'in_progress')
+
+# The values the tickets table's CHECK constraints allow
+TICKET_STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+TICKET_PRIORITIES = ('low', 'medium', 'high', 'critical')
+
+# /admin/analytics: days shown by default, the most it will show, and from how many days
+# on it shows one bar per month instead of one per day
+ANALYTICS_DAYS = 30
+ANALYTICS_MAX_DAYS = 3650
+ANALYTICS_MONTHLY_AFTER_DAYS = 90
+
+# Response and resolution time percentiles: the sketches answer within this relative error
+# (0.01 = a reported p90 of 100 minutes means the real p90 is between 99 and 101 minutes)
+SKETCH_ACCURACY = 0.01
+SKETCH_METRICS = ('first_response', 'resolution')
+
+# Email import: commit after this many messages, and skip any single message bigger than this
+# (so one huge attachment can't use up the server's memory)
+EMAIL_BATCH_SIZE = 2000
+MAX_EMAIL_BYTES = 10 * 1024 * 1024
+
+# Near-duplicate tickets (MinHash + LSH): every ticket's text is boiled down to
+# MINHASH_PERMUTATIONS numbers, split into LSH_BANDS bands. Tickets that agree on a whole
+# band share a bucket, which finds ~50%-similar tickets without comparing against all of them.
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.5
+DUPLICATES_SHOWN = 5
+# Most bucket neighbours we compare per ticket (very common text shares many buckets)
+DUPLICATE_CANDIDATE_LIMIT = 200
+
+# Most tickets one bulk update may change, and how many ids go into one "WHERE id IN (...)"
+# (older SQLite versions allow at most 999 ? placeholders per statement)
+MAX_BULK_TICKETS = 1000
+BULK_ID_CHUNK_SIZE = 500
+
+# Secondary indexes, grouped by schema version.
+# init_database() applies every version newer than the database's PRAGMA user_version,
+# then records the newest version, so each group runs exactly once per database.
+# To add indexes later, append a new (version, [statements]) entry - never edit an old one.
+INDEX_MIGRATIONS = [
+    (1, [
+        # Recent tickets on the home page and the admin-wide ticket list
+        "CREATE INDEX IF NOT EXISTS idx_tickets_updated ON tickets (updated_at)",
+        # Admin dashboard "recent tickets" (newest created first)
+        "CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets (created_at)",
+        # Agent and customer ticket lists, newest activity first
+        "CREATE INDEX IF NOT EXISTS idx_tickets_agent_updated ON tickets (assigned_agent_id, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_customer_updated ON tickets (customer_id, updated_at)",
+        # Filters on the /tickets page
+        "CREATE INDEX IF NOT EXISTS idx_tickets_status_updated ON tickets (status, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_priority_updated ON tickets (priority, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_category_updated ON tickets (category_id, updated_at)",
+        # Responses for one ticket in time order
+        "CREATE INDEX IF NOT EXISTS idx_responses_ticket_created ON responses (ticket_id, created_at)",
+    ]),
+    (2, [
+        # Full-text search (FTS5) over ticket titles/descriptions and response messages.
+        # "External content" tables store only the word index; the text stays in tickets
+        # and responses, and the triggers below copy every change into the index.
+        """CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+            title, description, content='tickets', content_rowid='id', prefix='2 3'
+        )""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS responses_fts USING fts5(
+            message, content='responses', content_rowid='id', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN
+            INSERT INTO tickets_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_update AFTER UPDATE OF title, description ON tickets BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO tickets_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS responses_fts_insert AFTER INSERT ON responses BEGIN
+            INSERT INTO responses_fts (rowid, message) VALUES (new.id, new.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS responses_fts_delete AFTER DELETE ON responses BEGIN
+            INSERT INTO responses_fts (responses_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS responses_fts_update AFTER UPDATE OF message ON responses BEGIN
+            INSERT INTO responses_fts (responses_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO responses_fts (rowid, message) VALUES (new.id, new.message);
+        END""",
+        # Index the tickets and responses that existed before search was added
+        "INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')",
+        "INSERT INTO responses_fts (responses_fts) VALUES ('rebuild')",
+    ]),
+    (3, [
+        # Daily rollups for /admin/analytics: one row per day for the whole help desk ('all', 0),
+        # for each category ('category', category_id) and for each agent ('agent', agent_id).
+        # dimension_id 0 means "no category" / "not assigned".
+        # Triggers add 1 when a ticket is opened, and when it moves into resolved or closed,
+        # so a chart reads one row per day instead of counting every ticket.
+        # The key starts with (dimension, day), so "last N days" is one range read.
+        """CREATE TABLE IF NOT EXISTS ticket_daily_stats (
+            dimension TEXT NOT NULL CHECK(dimension IN ('all', 'category', 'agent')),
+            dimension_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            opened INTEGER NOT NULL DEFAULT 0,
+            resolved INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, day, dimension_id)
+        ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS ticket_daily_stats_insert AFTER INSERT ON tickets BEGIN
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened)
+                VALUES ('all', 0, date(new.created_at), 1)
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE SET opened = opened + 1;
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened)
+                VALUES ('category', COALESCE(new.category_id, 0), date(new.created_at), 1)
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE SET opened = opened + 1;
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened)
+                VALUES ('agent', COALESCE(new.assigned_agent_id, 0), date(new.created_at), 1)
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE SET opened = opened + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS ticket_daily_stats_status AFTER UPDATE OF status ON tickets
+        WHEN new.status <> old.status AND new.status IN ('resolved', 'closed') BEGIN
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, resolved, closed)
+                VALUES ('all', 0, date('now'), new.status = 'resolved', new.status = 'closed')
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE
+                SET resolved = resolved + excluded.resolved, closed = closed + excluded.closed;
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, resolved, closed)
+                VALUES ('category', COALESCE(new.category_id, 0), date('now'), new.status = 'resolved', new.status = 'closed')
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE
+                SET resolved = resolved + excluded.resolved, closed = closed + excluded.closed;
+            INSERT INTO ticket_daily_stats (dimension, dimension_id, day, resolved, closed)
+                VALUES ('agent', COALESCE(new.assigned_agent_id, 0), date('now'), new.status = 'resolved', new.status = 'closed')
+                ON CONFLICT (dimension, day, dimension_id) DO UPDATE
+                SET resolved = resolved + excluded.resolved, closed = closed + excluded.closed;
+        END""",
+        # Fill in the history. We don't know when old tickets were resolved,
+        # so their last update is the best guess.
+        """INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened, resolved, closed)
+            SELECT 'all', 0, day, SUM(opened), SUM(resolved), SUM(closed) FROM (
+                SELECT 0 AS owner, date(created_at) AS day, 1 AS opened, 0 AS resolved, 0 AS closed FROM tickets
+                UNION ALL
+                SELECT 0, date(updated_at), 0, status = 'resolved', status = 'closed' FROM tickets
+                WHERE status IN ('resolved', 'closed')
+            ) GROUP BY owner, day""",
+        """INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened, resolved, closed)
+            SELECT 'category', owner, day, SUM(opened), SUM(resolved), SUM(closed) FROM (
+                SELECT COALESCE(category_id, 0) AS owner, date(created_at) AS day, 1 AS opened, 0 AS resolved, 0 AS closed FROM tickets
+                UNION ALL
+                SELECT COALESCE(category_id, 0), date(updated_at), 0, status = 'resolved', status = 'closed' FROM tickets
+                WHERE status IN ('resolved', 'closed')
+            ) GROUP BY owner, day""",
+        """INSERT INTO ticket_daily_stats (dimension, dimension_id, day, opened, resolved, closed)
+            SELECT 'agent', owner, day, SUM(opened), SUM(resolved), SUM(closed) FROM (
+                SELECT COALESCE(assigned_agent_id, 0) AS owner, date(created_at) AS day, 1 AS opened, 0 AS resolved, 0 AS closed FROM tickets
+                UNION ALL
+                SELECT COALESCE(assigned_agent_id, 0), date(updated_at), 0, status = 'resolved', status = 'closed' FROM tickets
+                WHERE status IN ('resolved', 'closed')
+            ) GROUP BY owner, day""",
+    ]),
+    (4, [
+        # When a ticket first got a reply from an agent/admin, and when it was first resolved
+        # or closed. ALTER TABLE ... ADD COLUMN can't say IF NOT EXISTS, but a migration
+        # only ever runs once per database.
+        "ALTER TABLE tickets ADD COLUMN first_response_at TIMESTAMP",
+        "ALTER TABLE tickets ADD COLUMN resolved_at TIMESTAMP",
+        """UPDATE tickets SET first_response_at = (
+            SELECT MIN(r.created_at) FROM responses r JOIN users u ON u.id = r.user_id
+            WHERE r.ticket_id = tickets.id AND u.role IN ('agent', 'admin')
+        )""",
+        # As in version 3, the last update is our best guess for older tickets
+        "UPDATE tickets SET resolved_at = updated_at WHERE status IN ('resolved', 'closed')",
+        # One QuantileSketch (as JSON) per metric and category/agent; see QuantileSketch.
+        # dimension_id 0 means "no category" / "not assigned".
+        """CREATE TABLE IF NOT EXISTS duration_sketches (
+            metric TEXT NOT NULL CHECK(metric IN ('first_response', 'resolution')),
+            dimension TEXT NOT NULL CHECK(dimension IN ('category', 'agent')),
+            dimension_id INTEGER NOT NULL,
+            sketch TEXT NOT NULL,
+            PRIMARY KEY (metric, dimension, dimension_id)
+        ) WITHOUT ROWID""",
+    ]),
+    (5, [
+        # Every imported email's Message-ID and the ticket (and response) it became.
+        # Replies find their ticket here through In-Reply-To/References, and
+        # importing the same mailbox twice skips the messages it already has.
+        """CREATE TABLE IF NOT EXISTS email_messages (
+            message_id TEXT PRIMARY KEY,
+            ticket_id INTEGER NOT NULL,
+            response_id INTEGER,
+            FOREIGN KEY (ticket_id) REFERENCES tickets (id),
+            FOREIGN KEY (response_id) REFERENCES responses (id)
+        ) WITHOUT ROWID""",
+    ]),
+    (6, [
+        # A duplicate ticket that was merged points to the ticket it was merged into
+        "ALTER TABLE tickets ADD COLUMN merged_into_id INTEGER REFERENCES tickets (id)",
+        # Each ticket's MinHash signature (MINHASH_PERMUTATIONS numbers packed into bytes)
+        """CREATE TABLE IF NOT EXISTS ticket_minhash (
+            ticket_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL,
+            FOREIGN KEY (ticket_id) REFERENCES tickets (id)
+        )""",
+        # LSH buckets: tickets with the same (band, bucket) are probably similar
+        """CREATE TABLE IF NOT EXISTS ticket_lsh (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            ticket_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, ticket_id)
+        ) WITHOUT ROWID""",
+    ]),
+]
+
 def get_db_connection():
     """Create and return a connection to the SQLite database."""
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     return conn
 
+# user id -> (user row, time it expires)
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
+def load_user(user_id):
+    """Return the users row for user_id, using the cross-request cache when it is fresh."""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    conn = get_db_connection()
+    user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    
+    if user is not None:
+        with _user_cache_lock:
+            if len(_user_cache) >= USER_CACHE_SIZE:
+                # Dictionaries remember insertion order, so the first key is the oldest entry
+                _user_cache.pop(next(iter(_user_cache)))
+            _user_cache[user_id] = (user, now + USER_CACHE_TTL)
+    return user
+
+def forget_user(user_id):
+    """Drop a user from the cache. Call this whenever a user's role or details change."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+    if has_app_context() and g.get('current_user') is not None and g.current_user['id'] == user_id:
+        g.pop('current_user')
+
+def get_current_user():
+    """Return the logged-in user's row, loading it at most once per request.
+    
+    flask.g lives for one request, so the second call in the same request
+    doesn't even need the cache lookup.
+    """
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user(user_id) if user_id else None
+    return g.current_user
+
+class TicketEventBus:
+    """A tiny in-process publish/subscribe hub for ticket changes.
+    
+    - Every open /events/tickets stream subscribes and gets its own queue.
+    - Routes that change tickets call publish() once; the bus copies the event
+      into the queue of every subscriber allowed to see it.
+    - Admins see every event; agents only see tickets assigned to them
+      (including a ticket that was just reassigned away from them).
+    - A browser that stops reading doesn't slow anyone down: when its queue is
+      full, new events for it are dropped.
+    
+    It only works inside one server process, which is how this app runs.
+    """
+    
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self, user):
+        """Start receiving events for this user; returns the queue to read from."""
+        events = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[events] = (user['role'], user['id'])
+        return events
+    
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers.pop(events, None)
+    
+    @staticmethod
+    def _can_see(role, user_id, event):
+        if role == 'admin':
+            return True
+        if user_id in event.get('agent_ids', ()):
+            return True  # bulk update summary touching this agent's tickets
+        return user_id in (event.get('assigned_agent_id'), event.get('previous_agent_id'))
+    
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for events, (role, user_id) in subscribers:
+            if self._can_see(role, user_id, event):
+                try:
+                    events.put_nowait(event)
+                except queue.Full:
+                    pass
+
+ticket_events = TicketEventBus()
+
+def publish_ticket_event(conn, event_type, ticket_id, **extra):
+    """Send the current state of one ticket to the live feed (call after commit)."""
+    ticket = conn.execute("""
+        SELECT id, title, status, priority, customer_id, assigned_agent_id, updated_at
+        FROM tickets WHERE id = ?
+    """, (ticket_id,)).fetchone()
+    if ticket:
+        ticket_events.publish(dict(ticket, type=event_type, **extra))
+
+def ticket_weight(ticket):
+    """How much one ticket adds to its agent's load (nothing once it is resolved or closed)."""
+    if ticket['status'] not in ACTIVE_STATUSES:
+        return 0
+    return PRIORITY_WEIGHTS.get(ticket['priority'], 1)
+
+class AgentLoadQueue:
+    """Keeps every agent's load in a heap so the least busy agent is found quickly.
+    
+    - The heap (Python's heapq) holds (load, agent_id) pairs with the smallest load
+      at the front, so picking an agent and putting them back costs O(log n).
+    - When a load changes we don't search the heap for the old pair; we push a new
+      one and throw the outdated pair away when it reaches the front
+      ("lazy deletion"). _loads always has the true numbers.
+    - rebuild() reads the loads from the database. It runs at startup, on first use,
+      and after a rebalance, and it also picks up agents added since the last rebuild.
+    
+    Like TicketEventBus it only lives inside one server process.
+    """
+    
+    def __init__(self):
+        self._heap = []
+        self._loads = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def rebuild(self, conn):
+        """Recalculate every agent's load from the tickets table."""
+        loads = {row['id']: 0 for row in conn.execute("SELECT id FROM users WHERE role = 'agent'")}
+        rows = conn.execute("""
+            SELECT assigned_agent_id, status, priority, COUNT(*) AS ticket_count FROM tickets
+            WHERE assigned_agent_id IS NOT NULL AND status IN ('open', 'in_progress')
+            GROUP BY assigned_agent_id, status, priority
+        """)
+        for row in rows:
+            if row['assigned_agent_id'] in loads:
+                loads[row['assigned_agent_id']] += ticket_weight(row) * row['ticket_count']
+        with self._lock:
+            self._loads = loads
+            self._heap = [(load, agent_id) for agent_id, load in loads.items()]
+            heapq.heapify(self._heap)
+            self._loaded = True
+    
+    def pick(self, conn, priority):
+        """Return the least busy agent's id and count a new ticket against them (None if no agents)."""
+        if not self._loaded:
+            self.rebuild(conn)
+        weight = PRIORITY_WEIGHTS.get(priority, 1)
+        with self._lock:
+            while self._heap:
+                load, agent_id = self._heap[0]
+                if self._loads.get(agent_id) != load:
+                    heapq.heappop(self._heap)  # outdated pair
+                    continue
+                self._loads[agent_id] = load + weight
+                heapq.heapreplace(self._heap, (load + weight, agent_id))
+                return agent_id
+        return None
+    
+    def adjust(self, agent_id, change):
+        """Add change (may be negative) to one agent's load."""
+        with self._lock:
+            if not change or agent_id not in self._loads:
+                return
+            self._loads[agent_id] += change
+            heapq.heappush(self._heap, (self._loads[agent_id], agent_id))
+            # Don't let outdated pairs pile up forever
+            if len(self._heap) > 4 * len(self._loads) + 16:
+                self._heap = [(load, agent) for agent, load in self._loads.items()]
+                heapq.heapify(self._heap)
+    
+    def ticket_changed(self, before, after):
+        """Move a ticket's weight from its old agent/priority/status to the new ones."""
+        self.adjust(before['assigned_agent_id'], -ticket_weight(before))
+        self.adjust(after['assigned_agent_id'], ticket_weight(after))
+    
+    def loads(self):
+        """Return a copy of {agent_id: load}."""
+        with self._lock:
+            return dict(self._loads)
+
+agent_queue = AgentLoadQueue()
+
+def rebalance_tickets(conn, move_assigned=False):
+    """Spread the waiting tickets evenly over the agents in one transaction.
+    
+    Tickets an agent has started (in_progress) stay put and count as fixed load.
+    Open tickets without an agent (and, with move_assigned, every open ticket) are
+    handed out heaviest first, each to the agent with the lowest load so far - the
+    "longest job first" rule, which keeps the busiest agent close to the best
+    possible load. Returns a list of (ticket_id, previous_agent_id) that moved.
+    """
+    loads = {row['id']: 0 for row in conn.execute("SELECT id FROM users WHERE role = 'agent'")}
+    if not loads:
+        return []
+    
+    waiting = []
+    for ticket in conn.execute("""
+        SELECT id, status, priority, assigned_agent_id FROM tickets
+        WHERE status IN ('open', 'in_progress')
+    """):
+        agent_id = ticket['assigned_agent_id']
+        if agent_id in loads and (ticket['status'] == 'in_progress' or not move_assigned):
+            loads[agent_id] += ticket_weight(ticket)
+        else:
+            # Unassigned, assigned to someone who is no longer an agent, or allowed to move
+            waiting.append(ticket)
+    
+    heap = [(load, agent_id) for agent_id, load in loads.items()]
+    heapq.heapify(heap)
+    waiting.sort(key=lambda ticket: (-ticket_weight(ticket), ticket['id']))
+    changes = []
+    moved = []
+    for ticket in waiting:
+        load, agent_id = heapq.heappop(heap)
+        heapq.heappush(heap, (load + ticket_weight(ticket), agent_id))
+        if ticket['assigned_agent_id'] != agent_id:
+            changes.append((agent_id, ticket['id']))
+            moved.append((ticket['id'], ticket['assigned_agent_id']))
+    
+    conn.executemany(
+        "UPDATE tickets SET assigned_agent_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", changes
+    )
+    conn.commit()
+    agent_queue.rebuild(conn)
+    return moved
+
+class QuantileSketch:
+    """A small summary of many durations that can still answer "what is the p90?".
+    
+    Keeping every value would grow forever, so instead we count how many values
+    fall into each bucket. Bucket edges grow by a fixed factor (about 2% apart),
+    the same idea as the DDSketch algorithm:
+    - Any percentile it reports is within SKETCH_ACCURACY (1%) of the true value.
+    - Two sketches merge by adding their bucket counts, so the percentiles for
+      "Billing + Technical Support" come from merging two sketches, exactly.
+    - One second to ten years needs about 1,000 buckets at most, so a sketch
+      stays a few KB no matter how many tickets it has seen.
+    """
+    
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}  # bucket number -> how many values fell into it
+        self.zero_count = 0  # values under one second
+        self.count = 0
+    
+    def add(self, value):
+        """Add one duration in seconds."""
+        if value < 1:
+            self.zero_count += 1
+        else:
+            bucket = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+    
+    def merge(self, other):
+        """Add all of other's values to this sketch."""
+        if other.accuracy != self.accuracy:
+            raise ValueError('Only sketches with the same accuracy can be merged')
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+    
+    def quantile(self, q):
+        """Return the value below which a fraction q (0.9 = p90) of the values fall."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                # The middle of the bucket, so the error is the same in both directions
+                return 2 * self.gamma ** bucket / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+    
+    def to_json(self):
+        return json.dumps({'a': self.accuracy, 'z': self.zero_count, 'b': sorted(self.buckets.items())},
+                          separators=(',', ':'))
+    
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(data['a'])
+        sketch.zero_count = data['z']
+        sketch.buckets = {bucket: count for bucket, count in data['b']}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+def add_to_sketches(conn, metric, samples):
+    """Add (category_id, agent_id, seconds) samples to the stored sketches (caller commits).
+    
+    Each sample goes into its category's sketch and its agent's sketch; every
+    sketch that changes is read and written back once.
+    """
+    grouped = {}
+    for category_id, agent_id, seconds in samples:
+        grouped.setdefault(('category', category_id or 0), []).append(seconds)
+        grouped.setdefault(('agent', agent_id or 0), []).append(seconds)
+    
+    for (dimension, dimension_id), values in grouped.items():
+        row = conn.execute(
+            "SELECT sketch FROM duration_sketches WHERE metric = ? AND dimension = ? AND dimension_id = ?",
+            (metric, dimension, dimension_id)
+        ).fetchone()
+        sketch = QuantileSketch.from_json(row['sketch']) if row else QuantileSketch()
+        for seconds in values:
+            sketch.add(seconds)
+        conn.execute("""
+            INSERT INTO duration_sketches (metric, dimension, dimension_id, sketch) VALUES (?, ?, ?, ?)
+            ON CONFLICT (metric, dimension, dimension_id) DO UPDATE SET sketch = excluded.sketch
+        """, (metric, dimension, dimension_id, sketch.to_json()))
+
+def record_first_response(conn, ticket_id, responder, responded_at=None):
+    """Stamp first_response_at the first time an agent/admin replies, and time it (caller commits).
+    
+    responded_at defaults to now; imported emails pass the time the reply was sent.
+    """
+    stamped = conn.execute(
+        "UPDATE tickets SET first_response_at = COALESCE(?, CURRENT_TIMESTAMP) WHERE id = ? AND first_response_at IS NULL",
+        (responded_at, ticket_id)
+    )
+    if stamped.rowcount:
+        ticket = conn.execute("""
+            SELECT category_id, assigned_agent_id,
+                   (julianday(first_response_at) - julianday(created_at)) * 86400 AS seconds
+            FROM tickets WHERE id = ?
+        """, (ticket_id,)).fetchone()
+        # Unassigned tickets count for whoever answered them
+        add_to_sketches(conn, 'first_response',
+                        [(ticket['category_id'], ticket['assigned_agent_id'] or responder['id'], ticket['seconds'])])
+
+def record_resolutions(conn, ticket_ids):
+    """Stamp resolved_at on tickets that were just resolved or closed for the first time,
+    and add their resolution times to the sketches (caller commits)."""
+    samples = []
+    for start in range(0, len(ticket_ids), BULK_ID_CHUNK_SIZE):
+        chunk = ticket_ids[start:start + BULK_ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = conn.execute(f"""
+            SELECT id, category_id, assigned_agent_id,
+                   (julianday('now') - julianday(created_at)) * 86400 AS seconds
+            FROM tickets
+            WHERE id IN ({placeholders}) AND status IN ('resolved', 'closed') AND resolved_at IS NULL
+        """, chunk).fetchall()
+        conn.executemany("UPDATE tickets SET resolved_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         [(row['id'],) for row in rows])
+        samples.extend((row['category_id'], row['assigned_agent_id'], row['seconds']) for row in rows)
+    if samples:
+        add_to_sketches(conn, 'resolution', samples)
+
+def init_duration_sketches(conn):
+    """Build the sketches from the tickets' timestamps the first time (when none exist yet)."""
+    if conn.execute("SELECT 1 FROM duration_sketches LIMIT 1").fetchone():
+        return
+    for metric, column in (('first_response', 'first_response_at'), ('resolution', 'resolved_at')):
+        # column comes from the line above, never from the user
+        rows = conn.execute(f"""
+            SELECT category_id, assigned_agent_id,
+                   (julianday({column}) - julianday(created_at)) * 86400 AS seconds
+            FROM tickets WHERE {column} IS NOT NULL
+        """)
+        add_to_sketches(conn, metric, [tuple(row) for row in rows])
+    conn.commit()
+
+def iter_mbox_messages(binary_file):
+    """Yield the raw bytes of each message in an mbox file, one at a time.
+    
+    An mbox file is many emails glued together; each one starts with a line
+    beginning "From " (lines like that inside a message are written as ">From ").
+    Reading line by line means only one message is in memory at a time, however
+    big the file is. Messages over MAX_EMAIL_BYTES are yielded as None.
+    """
+    lines = []
+    size = 0
+    for line in binary_file:
+        if line.startswith(b'From '):
+            if lines or size:
+                yield b''.join(lines) if size <= MAX_EMAIL_BYTES else None
+            lines = []
+            size = 0
+            continue
+        if line.startswith(b'>') and line.lstrip(b'>').startswith(b'From '):
+            line = line[1:]  # undo the ">From " escaping
+        size += len(line)
+        if size <= MAX_EMAIL_BYTES:
+            lines.append(line)
+        else:
+            lines = []  # too big: stop keeping it, but keep reading to the next message
+    if lines or size:
+        yield b''.join(lines) if size <= MAX_EMAIL_BYTES else None
+
+def iter_email_file(binary_file, filename):
+    """Yield the raw messages in one uploaded or local file (.eml = one message, anything else = mbox)."""
+    if filename.lower().endswith('.eml'):
+        raw = binary_file.read(MAX_EMAIL_BYTES + 1)
+        yield raw if len(raw) <= MAX_EMAIL_BYTES else None
+    else:
+        yield from iter_mbox_messages(binary_file)
+
+def email_timestamp(value):
+    """Turn a Date: header into the 'YYYY-MM-DD HH:MM:SS' UTC text SQLite uses (None if unreadable)."""
+    try:
+        sent = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=timezone.utc)
+    return sent.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def header_text(value):
+    """Decode a header like "=?utf-8?q?Caf=C3=A9?=" into normal text."""
+    try:
+        return str(make_header(decode_header(value or '')))
+    except (LookupError, ValueError, UnicodeDecodeError):
+        return str(value or '')
+
+def email_body(message):
+    """Return the text of the first plain-text part (or, failing that, HTML part) of a message."""
+    for wanted in ('text/plain', 'text/html'):
+        for part in message.walk():
+            if part.get_content_type() != wanted or part.get_filename():
+                continue  # other types, and attachments
+            payload = part.get_payload(decode=True) or b''
+            try:
+                text = payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+            except LookupError:
+                # A character set Python doesn't know
+                text = payload.decode('utf-8', errors='replace')
+            if wanted == 'text/html':
+                text = html.unescape(re.sub(r'<[^>]+>', ' ', text))
+            return text
+    return ''
+
+def parse_email(raw):
+    """Pull out what a ticket needs from one raw message, or return None if it can't be used.
+    
+    Python's newer email policy turns every header into a rich object, which made
+    parsing about ten times slower than everything else in an import put together,
+    so we use the classic (compat32) parser and decode the few headers we need.
+    """
+    message = BytesParser(policy=email_policy.compat32).parsebytes(raw)
+    name, address = parseaddr(header_text(message.get('From')))
+    if '@' not in address:
+        return None
+    
+    # Replies name the message they answer in In-Reply-To, and the whole thread in References
+    # (newest first, so the closest message we know about wins)
+    parents = re.findall(r'<[^<>\s]+>', str(message.get('In-Reply-To', '')))
+    parents += reversed(re.findall(r'<[^<>\s]+>', str(message.get('References', ''))))
+    
+    message_ids = re.findall(r'<[^<>\s]+>', str(message.get('Message-ID', '')))
+    # Without an id we use a fingerprint, so importing the same file twice still skips it
+    message_id = message_ids[0] if message_ids else '<sha256-' + hashlib.sha256(raw).hexdigest() + '>'
+    
+    return {
+        'message_id': message_id,
+        'parents': parents,
+        'email': address.lower(),
+        'name': name,
+        'subject': (header_text(message.get('Subject')).strip() or '(no subject)')[:200],
+        'body': email_body(message).strip() or '(no message body)',
+        'sent_at': email_timestamp(message.get('Date'))
+    }
+
+def email_sender(conn, sender, known_users, counts):
+    """Return {'id', 'role'} of the user with the sender's email, creating a customer if there is none."""
+    if sender['email'] in known_users:
+        return known_users[sender['email']]
+    row = conn.execute("SELECT id, role FROM users WHERE email = ?", (sender['email'],)).fetchone()
+    if row:
+        user_id = row['id']
+    else:
+        base = re.sub(r'[^a-z0-9._-]', '', sender['email'].split('@')[0]) or 'customer'
+        username = base
+        number = 1
+        while conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+            number += 1
+            username = f'{base}{number}'
+        # A random password: imported customers can't log in until an admin sets one
+        user_id = conn.execute(
+            "INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, 'customer')",
+            (username, sender['email'], secrets.token_urlsafe(16))
+        ).lastrowid
+        counts['users_created'] += 1
+        row = {'id': user_id, 'role': 'customer'}
+    # Keep the lookup table from growing without limit on huge imports
+    if len(known_users) > 10000:
+        known_users.clear()
+    known_users[sender['email']] = {'id': row['id'], 'role': row['role']}
+    return known_users[sender['email']]
+
+def import_emails(conn, raw_messages, batch_size=None, progress=None):
+    """Turn a stream of raw emails into tickets and responses.
+    
+    - A message whose In-Reply-To/References names an imported message becomes a
+      response on that message's ticket; any other message opens a new ticket.
+    - Senders are matched to users by email address; unknown senders become customers.
+    - Messages already imported (same Message-ID) are skipped.
+    - Work is committed every batch_size messages, because one transaction per
+      message would be far slower. progress(counts) is called after each commit.
+    
+    New tickets are left unassigned; use "Rebalance Ticket Queue" afterwards.
+    Returns a dict of counts.
+    """
+    batch_size = batch_size or EMAIL_BATCH_SIZE
+    counts = {'messages': 0, 'tickets': 0, 'responses': 0, 'duplicates': 0, 'skipped': 0, 'users_created': 0}
+    known_users = {}
+    
+    for raw in raw_messages:
+        counts['messages'] += 1
+        parsed = parse_email(raw) if raw else None
+        if parsed is None:
+            counts['skipped'] += 1
+        elif conn.execute("SELECT 1 FROM email_messages WHERE message_id = ?", (parsed['message_id'],)).fetchone():
+            counts['duplicates'] += 1
+        else:
+            user = email_sender(conn, parsed, known_users, counts)
+            ticket_id = None
+            for parent in parsed['parents']:
+                row = conn.execute("SELECT ticket_id FROM email_messages WHERE message_id = ?", (parent,)).fetchone()
+                if row:
+                    ticket_id = row['ticket_id']
+                    break
+            
+            response_id = None
+            if ticket_id:
+                response_id = conn.execute("""
+                    INSERT INTO responses (ticket_id, user_id, message, created_at)
+                    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                """, (ticket_id, user['id'], parsed['body'], parsed['sent_at'])).lastrowid
+                conn.execute(
+                    "UPDATE tickets SET updated_at = MAX(updated_at, COALESCE(?, CURRENT_TIMESTAMP)) WHERE id = ?",
+                    (parsed['sent_at'], ticket_id)
+                )
+                if user['role'] in ['agent', 'admin']:
+                    record_first_response(conn, ticket_id, user, parsed['sent_at'])
+                counts['responses'] += 1
+            else:
+                ticket_id = conn.execute("""
+                    INSERT INTO tickets (title, description, customer_id, created_at, updated_at)
+                    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+                """, (parsed['subject'], parsed['body'], user['id'], parsed['sent_at'], parsed['sent_at'])).lastrowid
+                counts['tickets'] += 1
+            
+            conn.execute(
+                "INSERT INTO email_messages (message_id, ticket_id, response_id) VALUES (?, ?, ?)",
+                (parsed['message_id'], ticket_id, response_id)
+            )
+        
+        if counts['messages'] % batch_size == 0:
+            conn.commit()
+            if progress:
+                progress(counts)
+    
+    conn.commit()
+    if progress and counts['messages'] % batch_size:
+        progress(counts)
+    # Let duplicate detection see the new tickets too
+    index_missing_signatures(conn)
+    return counts
+
+# Reads MINHASH_PERMUTATIONS unsigned 64-bit numbers from bytes (and packs them back)
+_signature_format = struct.Struct(f'<{MINHASH_PERMUTATIONS}Q')
+
+def minhash_signature(text):
+    """Return the MinHash signature of some text, or None if it has no words.
+    
+    The text becomes a set of "shingles" (every run of 3 words in a row). Each shingle
+    gets MINHASH_PERMUTATIONS independent hash values (one SHAKE-128 digest, cut into
+    64-bit pieces), and position i of the signature keeps the smallest value i of any
+    shingle. Two texts agree on a position with probability equal to their Jaccard
+    similarity (shared shingles / all shingles), so comparing signatures estimates it.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    shingles = {' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    # Python's hash() changes between runs, so use a hash from hashlib
+    hashed = (_signature_format.unpack(hashlib.shake_128(shingle.encode()).digest(_signature_format.size))
+              for shingle in shingles)
+    return tuple(map(min, zip(*hashed)))
+
+def lsh_buckets(signature):
+    """Split a signature into LSH_BANDS bands and return (band, bucket) for each."""
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets = []
+    for band in range(LSH_BANDS):
+        packed = struct.pack(f'<{rows}Q', *signature[band * rows:(band + 1) * rows])
+        digest = hashlib.blake2b(packed, digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return buckets
+
+def index_ticket_text(conn, ticket_id, text):
+    """Store a ticket's signature and LSH buckets (caller commits)."""
+    signature = minhash_signature(text)
+    if signature is None:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO ticket_minhash (ticket_id, signature) VALUES (?, ?)",
+        (ticket_id, _signature_format.pack(*signature))
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO ticket_lsh (band, bucket, ticket_id) VALUES (?, ?, ?)",
+        [(band, bucket, ticket_id) for band, bucket in lsh_buckets(signature)]
+    )
+
+def index_missing_signatures(conn):
+    """Give every ticket that doesn't have a signature yet one (existing and imported tickets)."""
+    rows = conn.execute("""
+        SELECT t.id, t.title, t.description FROM tickets t
+        LEFT JOIN ticket_minhash m ON m.ticket_id = t.id
+        WHERE m.ticket_id IS NULL AND t.merged_into_id IS NULL
+    """).fetchall()
+    for row in rows:
+        index_ticket_text(conn, row['id'], f"{row['title']} {row['description']}")
+    conn.commit()
+
+def find_duplicates(conn, ticket_id):
+    """Return up to DUPLICATES_SHOWN tickets that look like copies of this one, most similar first.
+    
+    Only tickets sharing at least one LSH bucket are compared, so the work depends
+    on how many similar tickets there are, not on how many tickets exist.
+    Only the same customer's tickets are suggested: merging moves one ticket's
+    conversation into the other, so it must never cross between customers.
+    Each result has id, title, status and similarity (0.0 - 1.0).
+    """
+    row = conn.execute("""
+        SELECT m.signature, t.customer_id FROM ticket_minhash m
+        JOIN tickets t ON t.id = m.ticket_id
+        WHERE m.ticket_id = ?
+    """, (ticket_id,)).fetchone()
+    if not row:
+        return []
+    customer_id = row['customer_id']
+    signature = _signature_format.unpack(row['signature'])
+    buckets = lsh_buckets(signature)
+    
+    # One primary-key lookup per band (SQLite turns the ORs into separate index searches).
+    # The customer and merged filters come before the LIMIT, so other customers'
+    # tickets in a busy bucket can't use up the candidate slots.
+    matches = ' OR '.join('(l.band = ? AND l.bucket = ?)' for _ in buckets)
+    candidates = conn.execute(f"""
+        SELECT DISTINCT l.ticket_id FROM ticket_lsh l
+        JOIN tickets t ON t.id = l.ticket_id
+        WHERE ({matches}) AND l.ticket_id != ?
+          AND t.customer_id = ? AND t.merged_into_id IS NULL
+        LIMIT ?
+    """, [value for pair in buckets for value in pair]
+         + [ticket_id, customer_id, DUPLICATE_CANDIDATE_LIMIT]).fetchall()
+    if not candidates:
+        return []
+    
+    ids = [candidate['ticket_id'] for candidate in candidates]
+    rows = conn.execute(f"""
+        SELECT t.id, t.title, t.status, m.signature FROM tickets t
+        JOIN ticket_minhash m ON m.ticket_id = t.id
+        WHERE t.id IN ({', '.join('?' * len(ids))})
+    """, ids).fetchall()
+    
+    duplicates = []
+    for row in rows:
+        other = _signature_format.unpack(row['signature'])
+        similarity = sum(a == b for a, b in zip(signature, other)) / MINHASH_PERMUTATIONS
+        if similarity >= DUPLICATE_THRESHOLD:
+            duplicates.append({'id': row['id'], 'title': row['title'], 'status': row['status'],
+                               'similarity': similarity})
+    duplicates.sort(key=lambda duplicate: (-duplicate['similarity'], duplicate['id']))
+    return duplicates[:DUPLICATES_SHOWN]
+
+def merge_tickets(conn, duplicate_id, primary_id, user):
+    """Fold a duplicate ticket into the primary one (caller commits).
+    
+    - The duplicate's responses (and its emails, for threading replies) move to the primary.
+    - The duplicate's own description is kept as a note on the primary.
+    - The duplicate is closed (with resolved_at stamped, like any other close),
+      marked merged_into_id and removed from the LSH buckets.
+    Both tickets must belong to the same customer; otherwise ValueError is raised,
+    since the merge would show one customer's text to another.
+    """
+    duplicate = conn.execute("SELECT * FROM tickets WHERE id = ?", (duplicate_id,)).fetchone()
+    primary = conn.execute("SELECT customer_id FROM tickets WHERE id = ?", (primary_id,)).fetchone()
+    if duplicate['customer_id'] != primary['customer_id']:
+        raise ValueError("Tickets from different customers cannot be merged")
+    
+    conn.execute("UPDATE responses SET ticket_id = ? WHERE ticket_id = ?", (primary_id, duplicate_id))
+    conn.execute("UPDATE email_messages SET ticket_id = ? WHERE ticket_id = ?", (primary_id, duplicate_id))
+    conn.execute(
+        "INSERT INTO responses (ticket_id, user_id, message) VALUES (?, ?, ?)",
+        (primary_id, user['id'], f"Merged duplicate ticket #{duplicate_id}: {duplicate['title']}\n\n{duplicate['description']}")
+    )
+    conn.execute(
+        "INSERT INTO responses (ticket_id, user_id, message) VALUES (?, ?, ?)",
+        (duplicate_id, user['id'], f"This ticket was merged into ticket #{primary_id}.")
+    )
+    conn.execute("""
+        UPDATE tickets SET status = 'closed', merged_into_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    """, (primary_id, duplicate_id))
+    conn.execute("UPDATE tickets SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (primary_id,))
+    record_resolutions(conn, [duplicate_id])
+    
+    row = conn.execute("SELECT signature FROM ticket_minhash WHERE ticket_id = ?", (duplicate_id,)).fetchone()
+    if row:
+        signature = _signature_format.unpack(row['signature'])
+        conn.executemany("DELETE FROM ticket_lsh WHERE band = ? AND bucket = ? AND ticket_id = ?",
+                         [(band, bucket, duplicate_id) for band, bucket in lsh_buckets(signature)])
+    
+    # A closed ticket no longer counts towards its agent's load
+    agent_queue.ticket_changed(duplicate, {'status': 'closed', 'priority': duplicate['priority'],
+                                           'assigned_agent_id': duplicate['assigned_agent_id']})
+
 def init_database():
     """Initialize the database with required tables."""
     conn = get_db_connection()
@@ -92,6 +1072,11 @@ def init_database():
         )
     """)
     
+    apply_index_migrations(conn)
+    init_ticket_counters(conn)
+    init_duration_sketches(conn)
+    index_missing_signatures(conn)
+    
     # Insert default data
     try:
         # Default categories
@@ -121,6 +1106,142 @@ def init_database():
     
     conn.close()
 
+def apply_index_migrations(conn):
+    """Create any indexes from INDEX_MIGRATIONS this database doesn't have yet."""
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, statements in INDEX_MIGRATIONS:
+        if version <= current_version:
+            continue
+        for statement in statements:
+            conn.execute(statement)
+        # PRAGMA can't use ? placeholders; version is an int from our own list, so this is safe
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+
+def init_ticket_counters(conn):
+    """Create (or remove) the trigger-maintained ticket_counters table.
+    
+    Each row counts the tickets with one status for one "scope":
+    - ('all', 0, status): every ticket (admin dashboard)
+    - ('agent', agent_id, status): tickets assigned to one agent
+    - ('customer', customer_id, status): tickets opened by one customer
+    
+    Triggers on tickets add and subtract 1 whenever a ticket is created, deleted,
+    or changes status/assignment, so reading the dashboard numbers is a single
+    primary-key lookup instead of counting rows in tickets.
+    """
+    if not USE_TICKET_COUNTERS:
+        conn.executescript("""
+            DROP TRIGGER IF EXISTS ticket_counters_insert;
+            DROP TRIGGER IF EXISTS ticket_counters_update;
+            DROP TRIGGER IF EXISTS ticket_counters_delete;
+            DROP TABLE IF EXISTS ticket_counters;
+        """)
+        return
+    
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ticket_counters'"
+    ).fetchone()
+    
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS ticket_counters (
+            scope TEXT NOT NULL CHECK(scope IN ('all', 'agent', 'customer')),
+            owner_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            ticket_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, owner_id, status)
+        ) WITHOUT ROWID;
+        
+        CREATE TRIGGER IF NOT EXISTS ticket_counters_insert AFTER INSERT ON tickets BEGIN
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'all', 0, new.status, 1 WHERE 1
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'customer', new.customer_id, new.status, 1 WHERE 1
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'agent', new.assigned_agent_id, new.status, 1 WHERE new.assigned_agent_id IS NOT NULL
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS ticket_counters_delete AFTER DELETE ON tickets BEGIN
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'all' AND owner_id = 0 AND status = old.status;
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'customer' AND owner_id = old.customer_id AND status = old.status;
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'agent' AND owner_id = old.assigned_agent_id AND status = old.status;
+        END;
+        
+        -- An update is "remove the old ticket, add the new one" for the counters.
+        CREATE TRIGGER IF NOT EXISTS ticket_counters_update
+        AFTER UPDATE OF status, customer_id, assigned_agent_id ON tickets BEGIN
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'all' AND owner_id = 0 AND status = old.status;
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'customer' AND owner_id = old.customer_id AND status = old.status;
+            UPDATE ticket_counters SET ticket_count = ticket_count - 1
+                WHERE scope = 'agent' AND owner_id = old.assigned_agent_id AND status = old.status;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'all', 0, new.status, 1 WHERE 1
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'customer', new.customer_id, new.status, 1 WHERE 1
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'agent', new.assigned_agent_id, new.status, 1 WHERE new.assigned_agent_id IS NOT NULL
+                ON CONFLICT (scope, owner_id, status) DO UPDATE SET ticket_count = ticket_count + 1;
+        END;
+    """)
+    
+    if not exists:
+        # First run: count the tickets that were created before the counters existed
+        conn.executescript("""
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'all', 0, status, COUNT(*) FROM tickets GROUP BY status;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'customer', customer_id, status, COUNT(*) FROM tickets GROUP BY customer_id, status;
+            INSERT INTO ticket_counters (scope, owner_id, status, ticket_count)
+                SELECT 'agent', assigned_agent_id, status, COUNT(*) FROM tickets
+                WHERE assigned_agent_id IS NOT NULL GROUP BY assigned_agent_id, status;
+        """)
+
+def get_ticket_stats(conn, user):
+    """Return ticket counts by status for the tickets this user's dashboard covers.
+    
+    Admins see every ticket, agents see tickets assigned to them and customers
+    see their own tickets. The counts come from ticket_counters when it is enabled,
+    otherwise from one GROUP BY query over tickets (instead of one COUNT per status).
+    """
+    if user['role'] == 'admin':
+        scope, owner_id, column = 'all', 0, None
+    elif user['role'] == 'agent':
+        scope, owner_id, column = 'agent', user['id'], 'assigned_agent_id'
+    else:  # customer
+        scope, owner_id, column = 'customer', user['id'], 'customer_id'
+    
+    if USE_TICKET_COUNTERS:
+        rows = conn.execute(
+            "SELECT status, ticket_count FROM ticket_counters WHERE scope = ? AND owner_id = ?",
+            (scope, owner_id)
+        ).fetchall()
+    elif column:
+        rows = conn.execute(
+            f"SELECT status, COUNT(*) FROM tickets WHERE {column} = ? GROUP BY status",
+            (owner_id,)
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status").fetchall()
+    
+    counts = {row[0]: row[1] for row in rows}
+    return {
+        'total': sum(counts.values()),
+        'open': counts.get('open', 0),
+        'in_progress': counts.get('in_progress', 0),
+        'resolved': counts.get('resolved', 0),
+        'closed': counts.get('closed', 0)
+    }
+
 # Routes
 @app.route('/')
 def index():
@@ -129,24 +1250,10 @@ def index():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    user = get_current_user()
     
     # Get ticket statistics based on user role
-    if user['role'] == 'admin':
-        total_tickets = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
-        open_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE status = 'open'").fetchone()[0]
-        in_progress = conn.execute("SELECT COUNT(*) FROM tickets WHERE status = 'in_progress'").fetchone()[0]
-        resolved = conn.execute("SELECT COUNT(*) FROM tickets WHERE status = 'resolved'").fetchone()[0]
-    elif user['role'] == 'agent':
-        total_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE assigned_agent_id = ?", (user['id'],)).fetchone()[0]
-        open_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE assigned_agent_id = ? AND status = 'open'", (user['id'],)).fetchone()[0]
-        in_progress = conn.execute("SELECT COUNT(*) FROM tickets WHERE assigned_agent_id = ? AND status = 'in_progress'", (user['id'],)).fetchone()[0]
-        resolved = conn.execute("SELECT COUNT(*) FROM tickets WHERE assigned_agent_id = ? AND status = 'resolved'", (user['id'],)).fetchone()[0]
-    else:  # customer
-        total_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE customer_id = ?", (user['id'],)).fetchone()[0]
-        open_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE customer_id = ? AND status = 'open'", (user['id'],)).fetchone()[0]
-        in_progress = conn.execute("SELECT COUNT(*) FROM tickets WHERE customer_id = ? AND status = 'in_progress'", (user['id'],)).fetchone()[0]
-        resolved = conn.execute("SELECT COUNT(*) FROM tickets WHERE customer_id = ? AND status = 'resolved'", (user['id'],)).fetchone()[0]
+    stats = get_ticket_stats(conn, user)
     
     # Get recent tickets
     if user['role'] in ['admin', 'agent']:
@@ -168,13 +1275,6 @@ def index():
     
     conn.close()
     
-    stats = {
-        'total': total_tickets,
-        'open': open_tickets,
-        'in_progress': in_progress,
-        'resolved': resolved
-    }
-    
     return render_template('index.html', user=user, stats=stats, recent_tickets=recent_tickets)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -189,6 +1289,8 @@ def login():
         conn.close()
         
         if user:
+            # Start from fresh data in case the account changed since it was cached
+            forget_user(user['id'])
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
@@ -230,21 +1332,56 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/tickets')
-def tickets():
-    """List all tickets with filtering."""
-    if not session.get('user_id'):
-        return redirect(url_for('login'))
+def encode_cursor(data):
+    """Pack a small dict into a URL-safe string for the "next page" link."""
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Unpack a cursor made by encode_cursor(); returns None if it is missing or damaged."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def cursor_position(value):
+    """Return a cursor's [timestamp text, row id] position, or None if it has another shape.
     
-    conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    A cursor can be edited by hand, so anything that isn't exactly a string and a
+    whole number (True and False count as numbers in Python, so they are refused too)
+    is treated as "no cursor" instead of reaching the database.
+    """
+    if (isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+            and isinstance(value[1], int) and not isinstance(value[1], bool)):
+        return value
+    return None
+
+def read_ticket_filters(args):
+    """Return the status/priority/category filters from the query string, ignoring bad values."""
+    filters = {}
+    if args.get('status') in ('open', 'in_progress', 'resolved', 'closed'):
+        filters['status'] = args['status']
+    if args.get('priority') in ('low', 'medium', 'high', 'critical'):
+        filters['priority'] = args['priority']
+    if str(args.get('category', '')).isdigit():
+        filters['category'] = int(args['category'])
+    return filters
+
+def fetch_ticket_page(conn, user, filters, after=None, limit=TICKETS_PER_PAGE):
+    """Return one page of the tickets this user may see, newest activity first.
     
-    # Get filter parameters
-    status_filter = request.args.get('status', '')
-    priority_filter = request.args.get('priority', '')
-    category_filter = request.args.get('category', '')
+    Keyset pagination: instead of OFFSET (which makes SQLite walk past every
+    earlier row), the next page starts right after the last (updated_at, id) we
+    showed. The id breaks ties between tickets updated in the same second.
     
-    # Build query based on user role
+    Returns (tickets, next_cursor); next_cursor is None on the last page and
+    otherwise carries the position AND the filters, so the next page keeps them.
+    """
+    # Role decides which tickets and which joined columns this user gets
     if user['role'] == 'admin':
         query = """
             SELECT t.*, u.username as customer_name, u2.username as agent_name, c.name as category_name 
@@ -253,50 +1390,333 @@ def tickets():
             LEFT JOIN users u2 ON t.assigned_agent_id = u2.id 
             LEFT JOIN categories c ON t.category_id = c.id
         """
-        params = []
+        where_clauses, params = [], []
     elif user['role'] == 'agent':
         query = """
             SELECT t.*, u.username as customer_name, c.name as category_name 
             FROM tickets t 
             JOIN users u ON t.customer_id = u.id 
             LEFT JOIN categories c ON t.category_id = c.id 
-            WHERE t.assigned_agent_id = ?
         """
-        params = [user['id']]
+        where_clauses, params = ["t.assigned_agent_id = ?"], [user['id']]
     else:  # customer
         query = """
             SELECT t.*, c.name as category_name 
             FROM tickets t 
             LEFT JOIN categories c ON t.category_id = c.id 
-            WHERE t.customer_id = ?
         """
-        params = [user['id']]
+        where_clauses, params = ["t.customer_id = ?"], [user['id']]
     
     # Add filters
-    where_clauses = []
-    if status_filter:
+    if filters.get('status'):
         where_clauses.append("t.status = ?")
-        params.append(status_filter)
-    if priority_filter:
+        params.append(filters['status'])
+    if filters.get('priority'):
         where_clauses.append("t.priority = ?")
-        params.append(priority_filter)
-    if category_filter:
+        params.append(filters['priority'])
+    if filters.get('category'):
         where_clauses.append("t.category_id = ?")
-        params.append(category_filter)
+        params.append(filters['category'])
+    
+    # Continue after the last ticket of the previous page
+    if after:
+        where_clauses.append("(t.updated_at, t.id) < (?, ?)")
+        params.extend([after[0], after[1]])
     
     if where_clauses:
-        query += " AND " + " AND ".join(where_clauses)
+        query += " WHERE " + " AND ".join(where_clauses)
     
-    query += " ORDER BY t.updated_at DESC"
+    # Ask for one extra row to find out whether another page exists
+    query += " ORDER BY t.updated_at DESC, t.id DESC LIMIT ?"
+    params.append(limit + 1)
     
-    tickets = conn.execute(query, params).fetchall()
+    rows = conn.execute(query, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor({'after': [last['updated_at'], last['id']], 'filters': filters})
+    return rows, next_cursor
+
+def ticket_page_from_request(conn, user, limit=TICKETS_PER_PAGE):
+    """Read the filters and cursor from the URL and fetch that page.
+    
+    When a cursor is given, its filters win over the query string, so a
+    "next page" link can never mix pages of two different searches.
+    """
+    cursor = decode_cursor(request.args.get('cursor'))
+    if cursor:
+        cursor_filters = cursor.get('filters')
+        filters = read_ticket_filters(cursor_filters if isinstance(cursor_filters, dict) else {})
+        # [updated_at text, ticket id]; anything else means the first page
+        after = cursor_position(cursor.get('after'))
+    else:
+        filters = read_ticket_filters(request.args)
+        after = None
+    rows, next_cursor = fetch_ticket_page(conn, user, filters, after, limit)
+    return rows, next_cursor, filters, after is not None
+
+@app.route('/tickets')
+def tickets():
+    """List tickets with filtering, one page at a time."""
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    conn = get_db_connection()
+    user = get_current_user()
+    
+    tickets, next_cursor, filters, is_later_page = ticket_page_from_request(conn, user)
+    
+    # Quick stats cover all of the user's tickets, not just this page
+    stats = get_ticket_stats(conn, user)
     
     # Get categories for filter dropdown
     categories = conn.execute("SELECT * FROM categories ORDER BY name").fetchall()
     
+    # Get agents for bulk assignment (admin only)
+    agents = None
+    if user['role'] == 'admin':
+        agents = conn.execute("SELECT * FROM users WHERE role = 'agent' ORDER BY username").fetchall()
+    
     conn.close()
     
-    return render_template('tickets.html', tickets=tickets, categories=categories, user=user)
+    return render_template('tickets.html', tickets=tickets, categories=categories, user=user,
+                           stats=stats, filters=filters, next_cursor=next_cursor,
+                           is_later_page=is_later_page, agents=agents)
+
+def bulk_update_tickets(conn, ticket_ids, status=None, priority=None, assigned_agent_id=None):
+    """Apply the same changes to many tickets in one transaction.
+    
+    The UPDATE is prepared once and run for every id with executemany;
+    COALESCE(?, column) keeps a column as it is when its change is None.
+    Returns the rows as they were before the update (id, status, priority,
+    assigned_agent_id) for the tickets that exist.
+    """
+    before = []
+    for start in range(0, len(ticket_ids), BULK_ID_CHUNK_SIZE):
+        chunk = ticket_ids[start:start + BULK_ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        before.extend(conn.execute(
+            f"SELECT id, status, priority, assigned_agent_id FROM tickets WHERE id IN ({placeholders})", chunk
+        ).fetchall())
+    
+    conn.executemany("""
+        UPDATE tickets SET status = COALESCE(?, status), priority = COALESCE(?, priority),
+            assigned_agent_id = COALESCE(?, assigned_agent_id), updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, [(status, priority, assigned_agent_id, row['id']) for row in before])
+    if status:
+        record_resolutions(conn, [row['id'] for row in before])
+    conn.commit()
+    
+    # Keep the automatic-assignment loads in step
+    for row in before:
+        after = {
+            'status': status or row['status'],
+            'priority': priority or row['priority'],
+            'assigned_agent_id': assigned_agent_id or row['assigned_agent_id']
+        }
+        agent_queue.ticket_changed(row, after)
+    return before
+
+@app.route('/tickets/bulk-update', methods=['POST'])
+def bulk_update():
+    """Change the status, priority or agent of many tickets at once (agents and admins).
+    
+    Accepts the checkboxes from the tickets page (ticket_ids, status, priority,
+    assigned_agent_id) or the same fields as a JSON body, e.g.
+    {"ticket_ids": [1, 2, 3], "status": "resolved"}. Like update_ticket(),
+    only admins may change the assigned agent.
+    """
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    wants_json = request.is_json
+    data = (request.get_json(silent=True) or {}) if wants_json else request.form
+    
+    def finish(message, category, status_code=200):
+        if wants_json:
+            return {'message': message}, status_code
+        flash(message, category)
+        return redirect(request.referrer or url_for('tickets'))
+    
+    if user['role'] not in ['agent', 'admin']:
+        return finish('Access denied', 'error', 403)
+    
+    # A JSON body could be anything ([1, 2], "text", ...), so check its shape first
+    if wants_json and not isinstance(data, dict):
+        return finish('Send a JSON object', 'error', 400)
+    raw_ids = data.get('ticket_ids', []) if wants_json else request.form.getlist('ticket_ids')
+    # A string would be read one character at a time ("123" -> tickets 1, 2 and 3)
+    if not isinstance(raw_ids, list):
+        return finish('ticket_ids must be a list of ticket numbers', 'error', 400)
+    try:
+        ticket_ids = sorted({int(ticket_id) for ticket_id in raw_ids})
+    except (TypeError, ValueError):
+        return finish('Ticket ids must be numbers', 'error', 400)
+    status = data.get('status') or None
+    priority = data.get('priority') or None
+    assigned_agent_id = data.get('assigned_agent_id') or None
+    if assigned_agent_id is not None:
+        try:
+            assigned_agent_id = int(assigned_agent_id)
+        except (TypeError, ValueError):
+            return finish('Unknown agent', 'error', 400)
+    
+    if not ticket_ids:
+        return finish('Select at least one ticket', 'error', 400)
+    if len(ticket_ids) > MAX_BULK_TICKETS:
+        return finish(f'At most {MAX_BULK_TICKETS} tickets can be updated at once', 'error', 400)
+    if status and status not in TICKET_STATUSES or priority and priority not in TICKET_PRIORITIES:
+        return finish('Unknown status or priority', 'error', 400)
+    if assigned_agent_id and user['role'] != 'admin':
+        return finish('Only admins can assign tickets', 'error', 403)
+    
+    conn = get_db_connection()
+    if assigned_agent_id:
+        agent = conn.execute(
+            "SELECT id FROM users WHERE id = ? AND role = 'agent'", (assigned_agent_id,)
+        ).fetchone()
+        if not agent:
+            conn.close()
+            return finish('Unknown agent', 'error', 400)
+        assigned_agent_id = agent['id']
+    if not (status or priority or assigned_agent_id):
+        conn.close()
+        return finish('Choose a status, priority or agent to apply', 'error', 400)
+    
+    before = bulk_update_tickets(conn, ticket_ids, status, priority, assigned_agent_id)
+    conn.close()
+    
+    # One summary event instead of one per ticket
+    agent_ids = {row['assigned_agent_id'] for row in before} | {assigned_agent_id}
+    ticket_events.publish({
+        'type': 'tickets_bulk_updated',
+        'ticket_ids': [row['id'] for row in before],
+        'count': len(before),
+        'status': status,
+        'priority': priority,
+        'assigned_agent_id': assigned_agent_id,
+        'agent_ids': sorted(agent_id for agent_id in agent_ids if agent_id),
+        'updated_by': user['username']
+    })
+    
+    return finish(f'Updated {len(before)} ticket(s).', 'success')
+
+@app.route('/tickets.json')
+def tickets_json():
+    """The same ticket pages as /tickets, as JSON for pages that load tickets on demand.
+    
+    Example: /tickets.json?status=open&limit=50, then /tickets.json?cursor=<next_cursor>
+    """
+    if not session.get('user_id'):
+        return {'error': 'login required'}, 401
+    
+    limit = request.args.get('limit', TICKETS_PER_PAGE, type=int)
+    limit = max(1, min(limit, MAX_TICKETS_PER_PAGE))
+    
+    conn = get_db_connection()
+    user = get_current_user()
+    rows, next_cursor, filters, _ = ticket_page_from_request(conn, user, limit)
+    conn.close()
+    
+    return {
+        'tickets': [dict(row) for row in rows],
+        'filters': filters,
+        'next_cursor': next_cursor
+    }
+
+def build_fts_query(text):
+    """Turn what the user typed into a safe FTS5 query.
+    
+    Each word is quoted (so symbols aren't read as search operators) and gets a *
+    so "print" also finds "printer". Words separated by spaces must all match.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+def highlight(text):
+    """Escape a snippet for HTML, then turn the FTS5 markers into <mark> tags."""
+    safe_text = str(escape(text or ''))
+    return Markup(safe_text.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+@app.route('/tickets/search')
+def search_tickets():
+    """Full-text search over ticket titles, descriptions and responses.
+    
+    Both FTS5 tables are searched; each match gets a bm25 score (lower is better,
+    title words count most). Matches are grouped per ticket, keeping the best
+    score, and only the top SEARCH_RESULTS_LIMIT tickets are kept. The snippet is
+    made last, for those tickets only, since snippet() is the slow part.
+    Customers only get their own tickets; that filter is applied inside the search
+    itself, so other customers' matches are never scored.
+    """
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    query_text = request.args.get('q', '').strip()
+    fts_query = build_fts_query(query_text)
+    results = []
+    
+    if fts_query:
+        ticket_filter = response_filter = ''
+        ticket_params = [fts_query]
+        response_params = [fts_query]
+        if user['role'] == 'customer':
+            # CROSS JOIN makes SQLite read the full-text matches first and look each
+            # ticket up by id; otherwise it may re-run the MATCH once per customer ticket
+            ticket_filter = 'CROSS JOIN tickets t ON t.id = tickets_fts.rowid AND t.customer_id = ?'
+            response_filter = 'CROSS JOIN tickets t ON t.id = r.ticket_id AND t.customer_id = ?'
+            ticket_params.insert(0, user['id'])
+            response_params.insert(0, user['id'])
+        # In the order the ? appear below
+        params = (ticket_params + response_params + [SEARCH_RESULTS_LIMIT]
+                  + [HIGHLIGHT_START, HIGHLIGHT_END, fts_query, HIGHLIGHT_START, HIGHLIGHT_END, fts_query])
+        
+        conn = get_db_connection()
+        rows = conn.execute(f"""
+            WITH matches AS (
+                -- source 0 = the ticket itself, 1 = one of its responses
+                SELECT tickets_fts.rowid AS ticket_id,
+                       bm25(tickets_fts, 10.0, 1.0) AS score,
+                       0 AS source, tickets_fts.rowid AS match_id
+                FROM tickets_fts {ticket_filter}
+                WHERE tickets_fts MATCH ?
+                UNION ALL
+                SELECT r.ticket_id,
+                       bm25(responses_fts) AS score,
+                       1 AS source, responses_fts.rowid AS match_id
+                FROM responses_fts JOIN responses r ON r.id = responses_fts.rowid {response_filter}
+                WHERE responses_fts MATCH ?
+            ),
+            best AS (
+                -- MIN() picks the best score; SQLite returns source and match_id from that same row
+                SELECT ticket_id, MIN(score) AS score, source, match_id
+                FROM matches GROUP BY ticket_id
+                ORDER BY score
+                LIMIT ?
+            )
+            SELECT t.*, c.name as category_name,
+                   CASE best.source
+                       WHEN 0 THEN (SELECT snippet(tickets_fts, -1, ?, ?, '...', 16) FROM tickets_fts
+                                    WHERE tickets_fts MATCH ? AND rowid = best.match_id)
+                       ELSE (SELECT snippet(responses_fts, 0, ?, ?, '...', 16) FROM responses_fts
+                             WHERE responses_fts MATCH ? AND rowid = best.match_id)
+                   END AS snippet
+            FROM best
+            JOIN tickets t ON t.id = best.ticket_id
+            LEFT JOIN categories c ON t.category_id = c.id
+            ORDER BY best.score
+        """, params).fetchall()
+        conn.close()
+        
+        for row in rows:
+            result = dict(row)
+            result['snippet'] = highlight(row['snippet'])
+            results.append(result)
+    
+    return render_template('search_tickets.html', query=query_text, results=results, user=user)
 
 @app.route('/tickets/new', methods=['GET', 'POST'])
 def new_ticket():
@@ -311,11 +1731,15 @@ def new_ticket():
         priority = request.form.get('priority')
         
         conn = get_db_connection()
-        conn.execute("""
-            INSERT INTO tickets (title, description, category_id, priority, customer_id) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (title, description, category_id, priority, session['user_id']))
+        # Give the ticket to the least busy agent right away
+        agent_id = agent_queue.pick(conn, priority) if AUTO_ASSIGN_TICKETS else None
+        cursor = conn.execute("""
+            INSERT INTO tickets (title, description, category_id, priority, customer_id, assigned_agent_id) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (title, description, category_id, priority, session['user_id'], agent_id))
+        index_ticket_text(conn, cursor.lastrowid, f"{title} {description}")
         conn.commit()
+        publish_ticket_event(conn, 'ticket_created', cursor.lastrowid)
         conn.close()
         
         flash('Ticket created successfully!', 'success')
@@ -327,6 +1751,39 @@ def new_ticket():
     
     return render_template('new_ticket.html', categories=categories)
 
+def fetch_response_page(conn, ticket_id, before=None, limit=RESPONSES_PER_PAGE):
+    """Return up to `limit` responses that come before `before`, oldest first.
+    
+    We read newest-first with the (ticket_id, created_at) index and stop after
+    `limit` rows, then flip the list so the conversation reads top to bottom.
+    `before` is the (created_at, id) of the oldest response already on screen.
+    
+    Returns (responses, older_cursor); older_cursor is None when there is nothing older.
+    """
+    query = """
+        SELECT r.*, u.username 
+        FROM responses r 
+        JOIN users u ON r.user_id = u.id 
+        WHERE r.ticket_id = ? 
+    """
+    params = [ticket_id]
+    if before:
+        query += " AND (r.created_at, r.id) < (?, ?)"
+        params.extend([before[0], before[1]])
+    query += " ORDER BY r.created_at DESC, r.id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = conn.execute(query, params).fetchall()
+    older_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # limit=0 asks for no responses, so there is no oldest one to point at
+        if rows:
+            oldest = rows[-1]
+            older_cursor = encode_cursor({'before': [oldest['created_at'], oldest['id']]})
+    rows.reverse()
+    return rows, older_cursor
+
 @app.route('/tickets/<int:ticket_id>')
 def view_ticket(ticket_id):
     """View a specific ticket and its responses."""
@@ -334,7 +1791,7 @@ def view_ticket(ticket_id):
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    user = get_current_user()
     
     # Get ticket with related information
     ticket = conn.execute("""
@@ -357,23 +1814,55 @@ def view_ticket(ticket_id):
         flash('Access denied', 'error')
         return redirect(url_for('tickets'))
     
-    # Get responses
-    responses = conn.execute("""
-        SELECT r.*, u.username 
-        FROM responses r 
-        JOIN users u ON r.user_id = u.id 
-        WHERE r.ticket_id = ? 
-        ORDER BY r.created_at ASC
-    """, (ticket_id,)).fetchall()
+    # Get the newest responses (older ones are loaded on demand by ticket_responses())
+    responses, older_cursor = fetch_response_page(conn, ticket_id)
+    response_count = conn.execute(
+        "SELECT COUNT(*) FROM responses WHERE ticket_id = ?", (ticket_id,)
+    ).fetchone()[0]
     
     # Get agents for assignment (admin only)
     agents = None
     if user['role'] == 'admin':
         agents = conn.execute("SELECT * FROM users WHERE role = 'agent' ORDER BY username").fetchall()
     
+    # Likely duplicates from the same customer (agents/admins only - they do the merging)
+    duplicates = []
+    if user['role'] in ['agent', 'admin'] and not ticket['merged_into_id']:
+        duplicates = find_duplicates(conn, ticket_id)
+    
     conn.close()
     
-    return render_template('view_ticket.html', ticket=ticket, responses=responses, user=user, agents=agents)
+    return render_template('view_ticket.html', ticket=ticket, responses=responses, user=user, agents=agents,
+                           response_count=response_count, older_cursor=older_cursor, duplicates=duplicates)
+
+@app.route('/tickets/<int:ticket_id>/responses')
+def ticket_responses(ticket_id):
+    """Return an older page of a ticket's responses as JSON.
+    
+    view_ticket.html calls this with ?before=<cursor> when the user scrolls to
+    the top of the conversation. The responses come back as ready-made HTML
+    (the same _response.html partial the page uses) plus the cursor for the
+    page before them, or null when the first response has been reached.
+    """
+    if not session.get('user_id'):
+        return {'error': 'login required'}, 401
+    
+    conn = get_db_connection()
+    user = get_current_user()
+    
+    ticket = conn.execute("SELECT customer_id FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+    if not ticket or (user['role'] == 'customer' and ticket['customer_id'] != user['id']):
+        conn.close()
+        return {'error': 'ticket not found'}, 404
+    
+    cursor = decode_cursor(request.args.get('before')) or {}
+    # [created_at text, response id]; anything else means the newest page
+    before = cursor_position(cursor.get('before'))
+    responses, older_cursor = fetch_response_page(conn, ticket_id, before)
+    conn.close()
+    
+    html = ''.join(render_template('_response.html', response=response) for response in responses)
+    return {'html': html, 'count': len(responses), 'older_cursor': older_cursor}
 
 @app.route('/tickets/<int:ticket_id>/respond', methods=['POST'])
 def respond_to_ticket(ticket_id):
@@ -395,7 +1884,7 @@ def respond_to_ticket(ticket_id):
         flash('Ticket not found', 'error')
         return redirect(url_for('tickets'))
     
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    user = get_current_user()
     if user['role'] == 'customer' and ticket['customer_id'] != user['id']:
         conn.close()
         flash('Access denied', 'error')
@@ -414,7 +1903,12 @@ def respond_to_ticket(ticket_id):
     # Update ticket timestamp
     conn.execute("UPDATE tickets SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (ticket_id,))
     
+    # Time to first response (only the first agent/admin reply counts)
+    if user['role'] in ['agent', 'admin']:
+        record_first_response(conn, ticket_id, user)
+    
     conn.commit()
+    publish_ticket_event(conn, 'response_added', ticket_id, responder=user['username'])
     conn.close()
     
     flash('Response added successfully!', 'success')
@@ -427,7 +1921,7 @@ def update_ticket(ticket_id):
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    user = get_current_user()
     if user['role'] not in ['agent', 'admin']:
         conn.close()
         flash('Access denied', 'error')
@@ -452,17 +1946,253 @@ def update_ticket(ticket_id):
         params.append(assigned_agent_id)
     
     if updates:
+        # Remember the old agent so they also hear about a reassignment away from them,
+        # and the old status/priority so the agent loads can be corrected
+        load_query = "SELECT status, priority, assigned_agent_id FROM tickets WHERE id = ?"
+        previous = conn.execute(load_query, (ticket_id,)).fetchone()
+        
         updates.append("updated_at = CURRENT_TIMESTAMP")
         query = f"UPDATE tickets SET {', '.join(updates)} WHERE id = ?"
         params.append(ticket_id)
         
         conn.execute(query, params)
+        if status:
+            record_resolutions(conn, [ticket_id])
         conn.commit()
+        current = conn.execute(load_query, (ticket_id,)).fetchone()
+        if previous and current:
+            agent_queue.ticket_changed(previous, current)
+        publish_ticket_event(conn, 'ticket_updated', ticket_id,
+                             previous_agent_id=previous['assigned_agent_id'] if previous else None)
         flash('Ticket updated successfully!', 'success')
     
     conn.close()
     return redirect(url_for('view_ticket', ticket_id=ticket_id))
 
+@app.route('/admin/analytics')
+def admin_analytics():
+    """Ticket trends (opened, resolved, closed) by day or month, category and agent.
+    
+    Everything here comes from the ticket_daily_stats rollups, never from tickets,
+    so the page costs the same whether the help desk has 100 tickets or 10 million:
+    it only depends on how many days (and categories/agents) are shown.
+    """
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if user['role'] != 'admin':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+    
+    days = request.args.get('days', ANALYTICS_DAYS, type=int)
+    days = max(1, min(days, ANALYTICS_MAX_DAYS))
+    monthly = days > ANALYTICS_MONTHLY_AFTER_DAYS
+    # 'YYYY-MM-DD' -> first 7 characters 'YYYY-MM' groups the days into months
+    period_length = 7 if monthly else 10
+    
+    conn = get_db_connection()
+    first_day = conn.execute("SELECT date('now', ?)", (f'-{days - 1} days',)).fetchone()[0]
+    
+    trend = conn.execute("""
+        SELECT substr(day, 1, ?) AS period, SUM(opened) AS opened,
+               SUM(resolved) AS resolved, SUM(closed) AS closed
+        FROM ticket_daily_stats
+        WHERE dimension = 'all' AND dimension_id = 0 AND day >= ?
+        GROUP BY period ORDER BY period
+    """, (period_length, first_day)).fetchall()
+    
+    by_category = conn.execute("""
+        SELECT COALESCE(c.name, 'No Category') AS name, SUM(s.opened) AS opened,
+               SUM(s.resolved) AS resolved, SUM(s.closed) AS closed
+        FROM ticket_daily_stats s LEFT JOIN categories c ON c.id = s.dimension_id
+        WHERE s.dimension = 'category' AND s.day >= ?
+        GROUP BY s.dimension_id ORDER BY opened DESC
+    """, (first_day,)).fetchall()
+    
+    by_agent = conn.execute("""
+        SELECT COALESCE(u.username, 'Not assigned') AS name, SUM(s.opened) AS opened,
+               SUM(s.resolved) AS resolved, SUM(s.closed) AS closed
+        FROM ticket_daily_stats s LEFT JOIN users u ON u.id = s.dimension_id
+        WHERE s.dimension = 'agent' AND s.day >= ?
+        GROUP BY s.dimension_id ORDER BY resolved DESC, opened DESC
+    """, (first_day,)).fetchall()
+    conn.close()
+    
+    # The tallest bar in the chart is 100% high; the rest are scaled to it
+    chart_max = max([max(row['opened'], row['resolved']) for row in trend] + [1])
+    
+    return render_template('analytics.html', user=user, days=days, monthly=monthly, trend=trend,
+                           by_category=by_category, by_agent=by_agent, chart_max=chart_max)
+
+@app.route('/admin/percentiles.json')
+def duration_percentiles():
+    """p50/p90/p99 time to first response and time to resolution, in seconds.
+    
+    Pick any categories (?category=1&category=3) or any agents (?agent=2&agent=5);
+    with neither, the numbers cover every ticket. The chosen sketches are merged,
+    so the answer costs a few small reads no matter how many tickets there are.
+    Use 0 for "no category" / "not assigned".
+    """
+    if not session.get('user_id'):
+        return {'error': 'login required'}, 401
+    
+    user = get_current_user()
+    if user['role'] != 'admin':
+        return {'error': 'access denied'}, 403
+    
+    try:
+        categories = [int(value) for value in request.args.getlist('category')]
+        agents = [int(value) for value in request.args.getlist('agent')]
+    except ValueError:
+        return {'error': 'category and agent must be numbers'}, 400
+    if categories and agents:
+        # Category and agent sketches overlap, so they can't be combined
+        return {'error': 'choose categories or agents, not both'}, 400
+    dimension, ids = ('agent', agents) if agents else ('category', categories)
+    
+    conn = get_db_connection()
+    query = "SELECT metric, sketch FROM duration_sketches WHERE dimension = ?"
+    params = [dimension]
+    if ids:
+        query += f" AND dimension_id IN ({', '.join('?' * len(ids))})"
+        params += ids
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    
+    merged = {metric: QuantileSketch() for metric in SKETCH_METRICS}
+    for row in rows:
+        merged[row['metric']].merge(QuantileSketch.from_json(row['sketch']))
+    
+    result = {'categories': categories, 'agents': agents}
+    for metric, sketch in merged.items():
+        result[metric] = {'count': sketch.count}
+        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            value = sketch.quantile(q)
+            result[metric][name] = round(value, 1) if value is not None else None
+    return result
+
+@app.route('/admin/import-email', methods=['GET', 'POST'])
+def import_email():
+    """Upload an mbox or .eml file and turn its messages into tickets (admin only).
+    
+    The upload is read as a stream, one message at a time. For very large
+    mailboxes the command line is better: python import_emails.py inbox.mbox
+    """
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if user['role'] != 'admin':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose an mbox or .eml file to import', 'error')
+            return redirect(url_for('import_email'))
+        
+        conn = get_db_connection()
+        counts = import_emails(conn, iter_email_file(upload.stream, upload.filename))
+        conn.close()
+        
+        flash(f"Imported {counts['messages']} message(s): {counts['tickets']} new ticket(s), "
+              f"{counts['responses']} response(s), {counts['users_created']} new customer(s), "
+              f"{counts['duplicates']} already imported, {counts['skipped']} skipped.", 'success')
+        return redirect(url_for('import_email'))
+    
+    return render_template('import_email.html', user=user)
+
+@app.route('/admin/rebalance', methods=['POST'])
+def rebalance():
+    """Hand out the waiting tickets evenly (admin only), e.g. after a spike of new tickets."""
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if user['role'] != 'admin':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+    
+    conn = get_db_connection()
+    moved = rebalance_tickets(conn, move_assigned=request.form.get('move_assigned') == '1')
+    for ticket_id, previous_agent_id in moved:
+        publish_ticket_event(conn, 'ticket_updated', ticket_id, previous_agent_id=previous_agent_id)
+    conn.close()
+    
+    flash(f'Rebalanced the queue: {len(moved)} ticket(s) reassigned.', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/tickets/<int:ticket_id>/merge', methods=['POST'])
+def merge_ticket(ticket_id):
+    """Merge a duplicate ticket into this one (agent/admin only)."""
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if user['role'] not in ['agent', 'admin']:
+        flash('Access denied', 'error')
+        return redirect(url_for('view_ticket', ticket_id=ticket_id))
+    
+    duplicate_id = request.form.get('duplicate_id', type=int)
+    conn = get_db_connection()
+    found = conn.execute(
+        "SELECT id, customer_id, merged_into_id FROM tickets WHERE id IN (?, ?)", (ticket_id, duplicate_id)
+    ).fetchall()
+    # Only one customer's tickets may be merged, or their conversations would mix
+    if (duplicate_id == ticket_id or len(found) != 2 or any(row['merged_into_id'] for row in found)
+            or found[0]['customer_id'] != found[1]['customer_id']):
+        conn.close()
+        flash('These tickets cannot be merged', 'error')
+        return redirect(url_for('view_ticket', ticket_id=ticket_id))
+    
+    previous = conn.execute("SELECT assigned_agent_id FROM tickets WHERE id = ?", (duplicate_id,)).fetchone()
+    merge_tickets(conn, duplicate_id, ticket_id, user)
+    conn.commit()
+    publish_ticket_event(conn, 'ticket_updated', duplicate_id, previous_agent_id=previous['assigned_agent_id'])
+    publish_ticket_event(conn, 'ticket_updated', ticket_id)
+    conn.close()
+    
+    flash(f'Ticket #{duplicate_id} was merged into this ticket.', 'success')
+    return redirect(url_for('view_ticket', ticket_id=ticket_id))
+
+@app.route('/events/tickets')
+def ticket_event_stream():
+    """Live ticket feed for agents and admins (Server-Sent Events).
+    
+    The browser opens this URL once with EventSource and keeps it open. Each
+    ticket change arrives as one "data: {...}" message, as soon as it happens,
+    so nobody has to keep refreshing /tickets.
+    """
+    if not session.get('user_id'):
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if user['role'] not in ['agent', 'admin']:
+        return Response('Access denied', status=403)
+    
+    events = ticket_events.subscribe(user)
+    
+    def generate():
+        try:
+            # Tell the browser how long to wait before reconnecting if the stream drops
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Lines starting with ":" are comments; they just keep the connection alive
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            # Runs when the browser disconnects
+            ticket_events.unsubscribe(events)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/admin')
 def admin_dashboard():
     """Admin dashboard for system overview."""
@@ -470,7 +2200,7 @@ def admin_dashboard():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session['user_id'],)).fetchone()
+    user = get_current_user()
     
     if user['role'] != 'admin':
         conn.close()
@@ -479,8 +2209,7 @@ def admin_dashboard():
     
     # Get system statistics
     total_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-    total_tickets = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
-    open_tickets = conn.execute("SELECT COUNT(*) FROM tickets WHERE status = 'open'").fetchone()[0]
+    ticket_stats = get_ticket_stats(conn, user)
     
     # Get recent tickets
     recent_tickets = conn.execute("""
@@ -501,8 +2230,8 @@ def admin_dashboard():
         'total_users': total_users,
         'customers': customers,
         'agents': agents,
-        'total_tickets': total_tickets,
-        'open_tickets': open_tickets
+        'total_tickets': ticket_stats['total'],
+        'open_tickets': ticket_stats['open']
     }
     
     return render_template('admin_dashboard.html', stats=stats, recent_tickets=recent_tickets, user=user)
@@ -511,5 +2240,10 @@ if __name__ == '__main__':
     # Initialize database
     init_database()
     
+    # Load every agent's current workload for automatic assignment
+    conn = get_db_connection()
+    agent_queue.rebuild(conn)
+    conn.close()
+    
     # Start the Flask development server
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,174 @@
+"""
+check_query_plans.py: Make sure every ticket and response query uses an index.
+
+Why?
+- A query without a usable index makes SQLite read the WHOLE tickets or responses table.
+  That is fine with 20 tickets and painfully slow with 200,000.
+- It is easy to add a new filter or ORDER BY and forget the index, so this script checks
+  the real SQL the routes run, every time you run it.
+
+How it works:
+1. Builds a throw-away database with init_database() (so it has the same indexes as the app)
+   and adds a few users, tickets and responses.
+2. Visits the routes as an admin, an agent and a customer with different filters,
+   recording every SQL statement the app runs.
+3. Asks SQLite for the plan of each statement with EXPLAIN QUERY PLAN.
+   A line like "SCAN tickets" (without "USING INDEX") means a full table scan.
+4. Prints the plans and exits with an error if any statement full-scans tickets or responses.
+
+How to run:
+    python check_query_plans.py
+    python check_query_plans.py --verbose    # also print the plan of every query that passed
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import app as helpdesk_app
+
+# Tables that must never be read from start to end.
+CHECKED_TABLES = ("tickets", "responses")
+
+
+def seed(conn):
+    """Add the users, tickets and responses the routes need to have something to show."""
+    conn.execute(
+        "INSERT INTO users (username, email, password, role) VALUES ('agent1', 'agent1@helpdesk.com', 'pw', 'agent')"
+    )
+    conn.execute(
+        "INSERT INTO users (username, email, password, role) VALUES ('customer1', 'customer1@helpdesk.com', 'pw', 'customer')"
+    )
+    agent_id = conn.execute("SELECT id FROM users WHERE username = 'agent1'").fetchone()[0]
+    customer_id = conn.execute("SELECT id FROM users WHERE username = 'customer1'").fetchone()[0]
+    for number in range(20):
+        cursor = conn.execute(
+            """
+            INSERT INTO tickets (title, description, status, priority, category_id, customer_id, assigned_agent_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                f"Ticket {number}",
+                "Something is broken with the office printer again today",
+                ("open", "in_progress", "resolved", "closed")[number % 4],
+                ("low", "medium", "high", "critical")[number % 4],
+                number % 5 + 1,
+                customer_id,
+                agent_id if number % 2 else None,
+            ),
+        )
+        conn.execute(
+            "INSERT INTO responses (ticket_id, user_id, message) VALUES (?, ?, 'Looking into it')",
+            (cursor.lastrowid, agent_id),
+        )
+    conn.commit()
+    # Give the tickets MinHash signatures so view_ticket() also runs its duplicate lookup
+    helpdesk_app.index_missing_signatures(conn)
+
+
+def visit_routes(statements):
+    """Visit the routes as every role, recording the SQL each request runs."""
+    original_get_db_connection = helpdesk_app.get_db_connection
+
+    def traced_connection():
+        conn = original_get_db_connection()
+        # The trace callback receives each statement with its ? values filled in.
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    helpdesk_app.get_db_connection = traced_connection
+    try:
+        logins = (("admin", "admin123"), ("agent1", "pw"), ("customer1", "pw"))
+        pages = (
+            "/",
+            "/tickets",
+            "/tickets?status=open",
+            "/tickets?priority=high",
+            "/tickets?category=2",
+            "/tickets?status=open&priority=high&category=1",
+            "/tickets/1",
+            "/tickets/2",
+            "/admin",
+            "/tickets/search?q=broken",
+        )
+        for username, password in logins:
+            client = helpdesk_app.app.test_client()
+            client.post("/login", data={"username": username, "password": password})
+            for page in pages:
+                client.get(page)
+            # Follow a "next page" cursor so the keyset condition is checked too
+            for page in ("/tickets.json?limit=3", "/tickets.json?limit=3&status=open"):
+                next_cursor = client.get(page).get_json().get("next_cursor")
+                if next_cursor:
+                    client.get("/tickets", query_string={"cursor": next_cursor})
+    finally:
+        helpdesk_app.get_db_connection = original_get_db_connection
+
+
+def table_aliases(sql):
+    """Return every name the plan may use for the checked tables (the table name or its alias)."""
+    names = set()
+    for table, alias in re.findall(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.IGNORECASE):
+        if table.lower() in CHECKED_TABLES:
+            names.add(table.lower())
+            if alias and alias.upper() not in ("WHERE", "JOIN", "LEFT", "INNER", "ON", "ORDER", "GROUP", "SET", "LIMIT"):
+                names.add(alias.lower())
+    return names
+
+
+def full_scans(conn, sql):
+    """Return (plan lines, full-scan lines) for one statement."""
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    names = table_aliases(sql)
+    bad = []
+    for line in plan:
+        match = re.match(r"SCAN (\w+)", line)
+        if match and match.group(1).lower() in names and "INDEX" not in line:
+            bad.append(line)
+    return plan, bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a helpdesk query full-scans tickets or responses.")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        helpdesk_app.DB_NAME = os.path.join(folder, "helpdesk.db")
+        helpdesk_app.init_database()
+        conn = helpdesk_app.get_db_connection()
+        seed(conn)
+        conn.close()
+
+        statements = []
+        visit_routes(statements)
+
+        conn = sqlite3.connect(helpdesk_app.DB_NAME)
+        failures = 0
+        checked = 0
+        seen = set()
+        for sql in statements:
+            normalized = " ".join(sql.split())
+            if normalized in seen or not re.match(r"(SELECT|UPDATE|DELETE)\b", normalized, re.IGNORECASE):
+                continue
+            seen.add(normalized)
+            if not table_aliases(normalized):
+                continue
+            checked += 1
+            plan, bad = full_scans(conn, normalized)
+            if bad or args.verbose:
+                print(("FULL SCAN: " if bad else "ok: ") + normalized)
+                for line in plan:
+                    print("    " + line)
+            failures += bool(bad)
+        conn.close()
+
+    print(f"\nChecked {checked} queries on {', '.join(CHECKED_TABLES)}: {failures} full table scan(s).")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
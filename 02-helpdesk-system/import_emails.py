@@ -0,0 +1,83 @@
+"""
+import_emails.py: Turn mbox and .eml files into help desk tickets from the command line.
+
+Why a command-line tool?
+- Moving an old email queue into the help desk can mean 100,000+ messages.
+  Uploading that through the web page would keep one request busy for minutes.
+- This script does the same work as the "Import Email" admin page
+  (app.import_emails()), reading straight from disk.
+
+How it works:
+- Each mbox file is read one message at a time, so memory use stays small
+  no matter how big the file is.
+- Replies (found through In-Reply-To/References) become responses on the
+  ticket they answer; other messages open new tickets.
+- The database is committed every --batch-size messages.
+- Running it again on the same files is safe: messages already imported are skipped.
+
+How to run:
+    python import_emails.py inbox.mbox
+    python import_emails.py old-mail/                  # every .eml and .mbox file in a folder
+    python import_emails.py inbox.mbox --db other.db --batch-size 5000
+"""
+
+import argparse
+import os
+import time
+
+import app as helpdesk_app
+
+
+def email_files(paths):
+    """Yield every file to import: the files given, and the .eml/.mbox files inside folders."""
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(('.eml', '.mbox')):
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def raw_messages(paths):
+    """Yield the raw bytes of every message in every file, one at a time."""
+    for path in email_files(paths):
+        with open(path, 'rb') as f:
+            yield from helpdesk_app.iter_email_file(f, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import mbox/.eml files as help desk tickets.")
+    parser.add_argument("paths", nargs="+", help="mbox files, .eml files or folders containing them")
+    parser.add_argument("--db", default=helpdesk_app.DB_NAME, help=f"database file (default: {helpdesk_app.DB_NAME})")
+    parser.add_argument("--batch-size", type=int, default=helpdesk_app.EMAIL_BATCH_SIZE,
+                        help=f"messages per transaction (default: {helpdesk_app.EMAIL_BATCH_SIZE})")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+
+    helpdesk_app.DB_NAME = args.db
+    helpdesk_app.init_database()
+    started = time.perf_counter()
+
+    def progress(counts):
+        elapsed = time.perf_counter() - started
+        print(f"  {counts['messages']:,} messages ({counts['messages'] / max(elapsed, 0.001):,.0f}/s): "
+              f"{counts['tickets']:,} tickets, {counts['responses']:,} responses", flush=True)
+
+    conn = helpdesk_app.get_db_connection()
+    try:
+        counts = helpdesk_app.import_emails(conn, raw_messages(args.paths), args.batch_size, progress)
+    finally:
+        conn.close()
+
+    print(f"\nDone in {time.perf_counter() - started:.1f}s: {counts['tickets']:,} new tickets, "
+          f"{counts['responses']:,} responses, {counts['users_created']:,} new customers, "
+          f"{counts['duplicates']:,} already imported, {counts['skipped']:,} skipped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Tests for the duplicate ticket suggestions.
+
+Run from the 02-helpdesk-system folder:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+# Let the tests import app.py from the folder above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as helpdesk_app
+
+TEXT = ("My laptop will not connect to the office wifi network after the latest update, "
+        "it keeps asking for the password again and again")
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A connection to a fresh database in a temporary folder."""
+    monkeypatch.setattr(helpdesk_app, 'DB_NAME', str(tmp_path / 'test.db'))
+    helpdesk_app.init_database()
+    conn = helpdesk_app.get_db_connection()
+    yield conn
+    conn.close()
+
+
+def add_ticket(conn, customer_id, text=TEXT):
+    """Insert a ticket with its signature and return its id."""
+    ticket_id = conn.execute(
+        "INSERT INTO tickets (title, description, customer_id) VALUES ('Wifi', ?, ?)", (text, customer_id)
+    ).lastrowid
+    helpdesk_app.index_ticket_text(conn, ticket_id, text)
+    return ticket_id
+
+
+def test_busy_bucket_still_finds_same_customer_duplicate(conn):
+    # Two customers file the same problem; the other one files it many more times
+    # than there are candidate slots
+    customer_id, other_id = (conn.execute(
+        "INSERT INTO users (username, email, password, role) VALUES (?, ?, 'pw', 'customer')",
+        (name, f'{name}@example.com')
+    ).lastrowid for name in ('alice', 'busy'))
+    ticket_id = add_ticket(conn, customer_id)
+    for _ in range(helpdesk_app.DUPLICATE_CANDIDATE_LIMIT + 50):
+        add_ticket(conn, other_id)
+    duplicate_id = add_ticket(conn, customer_id, TEXT.replace('latest', 'newest'))
+    conn.commit()
+
+    assert [duplicate['id'] for duplicate in helpdesk_app.find_duplicates(conn, ticket_id)] == [duplicate_id]
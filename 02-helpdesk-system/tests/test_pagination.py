@@ -0,0 +1,56 @@
+"""
+Tests for the "next page" / "older responses" cursors.
+
+Run from the 02-helpdesk-system folder:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+# Let the tests import app.py from the folder above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as helpdesk_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client logged in as the default admin, with a fresh database."""
+    monkeypatch.setattr(helpdesk_app, 'DB_NAME', str(tmp_path / 'test.db'))
+    helpdesk_app.init_database()
+    conn = helpdesk_app.get_db_connection()
+    conn.execute("INSERT INTO tickets (title, description, customer_id) VALUES ('Printer', 'It jams', 1)")
+    for number in range(helpdesk_app.RESPONSES_PER_PAGE + 5):
+        conn.execute("INSERT INTO responses (ticket_id, user_id, message) VALUES (1, 1, ?)", (f'reply {number}',))
+    conn.commit()
+    conn.close()
+
+    client = helpdesk_app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+@pytest.mark.parametrize('before', [
+    [{'a': 1}, 2],
+    ['x', [1]],
+    ['x', True],
+    [1, 2],
+    'x',
+])
+def test_malformed_response_cursor_means_no_cursor(client, before):
+    newest = client.get('/tickets/1/responses').get_json()
+    response = client.get('/tickets/1/responses',
+                          query_string={'before': helpdesk_app.encode_cursor({'before': before})})
+    assert response.status_code == 200
+    assert response.get_json() == newest
+
+
+def test_response_cursor_pages_back(client):
+    newest = client.get('/tickets/1/responses').get_json()
+    assert newest['count'] == helpdesk_app.RESPONSES_PER_PAGE
+    older = client.get('/tickets/1/responses', query_string={'before': newest['older_cursor']}).get_json()
+    assert older['count'] == 5
+    assert older['older_cursor'] is None
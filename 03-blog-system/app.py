@@ -26,11 +26,26 @@ Student Notes:
 
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 import sqlite3
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import hashlib
 import os
 import re
+import signal
+import sys
+import tempfile
+import threading
 from werkzeug.utils import secure_filename
 
+# Pillow makes the smaller copies of uploaded images. It's optional:
+# without it, every page simply shows the original upload.
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = "blog_secret_key_2024"
@@ -40,12 +55,42 @@ UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Uploads are stored by content: each file is named after the SHA-256 hash of its bytes,
+# so the same image uploaded five times is only saved once. Files are spread over
+# sub-folders named after the start of the hash (uploads/3f/a2/3fa2...png) so no
+# single folder ends up holding thousands of files.
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read (and hashed) at a time
+
+# Image variants
+# A 5MB photo shown in a 300px-wide card wastes most of its bytes. After an upload,
+# background workers save smaller copies (variants) of it, each as WebP plus a JPEG/PNG
+# fallback for older browsers. Templates list them in srcset and the browser picks the
+# smallest one that looks sharp.
+IMAGE_VARIANTS = {'thumb': 320, 'card': 768, 'full': 1600}  # name: width in pixels
+IMAGE_QUALITY = 80   # 0-100; higher is sharper but bigger
+IMAGE_WORKERS = 2    # images resized at the same time
+
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Database configuration
 DB_NAME = "blog.db"
 
+# Pre-rendered post HTML
+# format_content() runs several regular expressions over the whole post, but a post only
+# changes when it is written. So we render it once, save the HTML in the post_html table,
+# and keep the most-read posts in memory.
+# Bump RENDERER_VERSION whenever format_content() changes, so old saved HTML is redone.
+RENDERER_VERSION = 1
+POST_HTML_CACHE_SIZE = 200  # posts kept in memory
+
+# View counting
+# Writing view_count + 1 on every page view makes readers of a popular post queue up
+# for SQLite's write lock. Instead we count views in memory and a background thread
+# adds them to the database in one small batch.
+VIEW_FLUSH_INTERVAL = 5     # seconds between writes
+VIEW_FLUSH_THRESHOLD = 500  # ...or write sooner once this many views are waiting
+
 def get_db_connection():
     """Create and return a connection to the SQLite database."""
     conn = sqlite3.connect(DB_NAME)
@@ -137,6 +182,78 @@ def init_database():
         )
     """)
     
+    # Post HTML table - format_content() output, saved so views don't re-render it.
+    # updated_at is the posts.updated_at the HTML was made from; if they differ
+    # (or the renderer changed), the HTML is out of date and gets rendered again.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS post_html (
+            post_id INTEGER PRIMARY KEY,
+            updated_at TIMESTAMP,
+            renderer_version INTEGER NOT NULL,
+            html TEXT NOT NULL,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    """)
+    
+    # Image blobs table - one row per stored image file (see store_upload()).
+    # ref_count is how many posts use the image; when it drops to 0 the file is deleted.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Post images table - which posts use which image blob
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS post_images (
+            post_id INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (post_id, sha256),
+            FOREIGN KEY (post_id) REFERENCES posts (id),
+            FOREIGN KEY (sha256) REFERENCES image_blobs (sha256)
+        )
+    """)
+    
+    # Triggers keep image_blobs.ref_count in step with post_images automatically,
+    # so no code path can forget to update it
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS post_images_added AFTER INSERT ON post_images
+        BEGIN
+            UPDATE image_blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS post_images_removed AFTER DELETE ON post_images
+        BEGIN
+            UPDATE image_blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;
+        END
+    """)
+    
+    # Image variants table - the resized copies of each stored image
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_variants (
+            sha256 TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            format TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (sha256, variant, format),
+            FOREIGN KEY (sha256) REFERENCES image_blobs (sha256)
+        )
+    """)
+    
+    # Index so one query can fetch a post's approved comments already in date order
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comments_post_approved_created
+        ON comments (post_id, is_approved, created_at)
+    """)
+    
     # Add featured_image column if it doesn't exist (database migration)
     try:
         conn.execute("ALTER TABLE posts ADD COLUMN featured_image TEXT")
@@ -256,6 +373,229 @@ def validate_image_file(file):
     
     return True, "File is valid"
 
+def store_upload(conn, stream, extension):
+    """Save an uploaded file under its content hash and return (sha256, path, size).
+    
+    The bytes are hashed while they are copied to a temporary file, so the file is only
+    read once and never has to fit in memory. Then, looking at the image_blobs table:
+    - if an image with the same hash is already stored, the copy is thrown away and the
+      existing file is used (that is the deduplication)
+    - otherwise the temporary file is renamed to uploads/ab/cd/<hash>.<extension>
+      and a new image_blobs row is added
+    path is relative to the static folder, like posts.featured_image.
+    The caller must link the image to a post (add_post_image()) before committing.
+    Raises ValueError if the file is bigger than MAX_FILE_SIZE.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise ValueError(f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB")
+                digest.update(chunk)
+                out.write(chunk)
+        
+        sha256 = digest.hexdigest()
+        path = f"uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+        
+        # Writing to image_blobs locks the database for writing until the caller commits,
+        # so delete_unused_images() can't remove this image while we are reusing it.
+        # If the same bytes are already stored (maybe with another extension), the row
+        # is kept as it is and we use its path.
+        conn.execute(
+            "INSERT OR IGNORE INTO image_blobs (sha256, path, size) VALUES (?, ?, ?)",
+            (sha256, path, size)
+        )
+        path = conn.execute("SELECT path FROM image_blobs WHERE sha256 = ?", (sha256,)).fetchone()['path']
+        
+        full_path = os.path.join(os.path.dirname(UPLOAD_FOLDER), path)
+        if os.path.exists(full_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # os.replace is atomic, so nobody ever sees a half-written image
+            os.replace(temp_path, full_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    return sha256, path, size
+
+def add_post_image(conn, post_id, sha256):
+    """Record that a post uses a stored image (the trigger adds 1 to its ref_count)."""
+    conn.execute(
+        "INSERT OR IGNORE INTO post_images (post_id, sha256) VALUES (?, ?)",
+        (post_id, sha256)
+    )
+
+def delete_unused_images(conn):
+    """Delete image files that no post uses any more (ref_count 0).
+    
+    Another request may start using an image between our SELECT and DELETE, so each
+    DELETE checks ref_count again and a file is only removed if its row really went.
+    The files are removed before committing, while we still hold the database's write
+    lock: store_upload() has to wait for that lock, so it can't reuse a file we are
+    about to delete. (If the commit then fails, store_upload() puts back any missing
+    file the next time the same image is uploaded.)
+    Returns the number of images deleted.
+    """
+    unused = conn.execute("SELECT sha256, path FROM image_blobs WHERE ref_count <= 0").fetchall()
+    deleted = 0
+    for blob in unused:
+        cursor = conn.execute("DELETE FROM image_blobs WHERE sha256 = ? AND ref_count <= 0", (blob['sha256'],))
+        if cursor.rowcount != 1:
+            continue  # a post started using it again
+        deleted += 1
+        # Its resized copies go too
+        variants = conn.execute("SELECT path FROM image_variants WHERE sha256 = ?", (blob['sha256'],)).fetchall()
+        conn.execute("DELETE FROM image_variants WHERE sha256 = ?", (blob['sha256'],))
+        for path in [blob['path']] + [variant['path'] for variant in variants]:
+            try:
+                os.remove(os.path.join(os.path.dirname(UPLOAD_FOLDER), path))
+            except FileNotFoundError:
+                pass
+    conn.commit()
+    return deleted
+
+def make_image_variants(sha256, path):
+    """Save the resized copies of one stored image and record them in image_variants.
+    
+    Runs in a background worker (see queue_image_variants()). For each size in
+    IMAGE_VARIANTS it saves a WebP and a fallback (JPEG, or PNG for images with
+    transparency) next to the original: uploads/ab/cd/<hash>-card.webp and so on.
+    Sizes wider than the original are skipped, since they would look the same.
+    Returns the number of files saved.
+    """
+    conn = get_db_connection()
+    try:
+        # Variants belong to the image, not the post, so a re-uploaded image is done already
+        if conn.execute("SELECT 1 FROM image_variants WHERE sha256 = ?", (sha256,)).fetchone():
+            return 0
+        
+        static_folder = os.path.dirname(UPLOAD_FOLDER)
+        with Image.open(os.path.join(static_folder, path)) as original:
+            # Resizing an animated GIF would keep only its first frame
+            if getattr(original, 'is_animated', False):
+                return 0
+            # Phones store photos sideways plus a "rotate me" note; apply it now,
+            # because the note is lost when we save the copies
+            image = ImageOps.exif_transpose(original)
+            has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        
+        fallback = 'png' if has_alpha else 'jpeg'
+        base = os.path.splitext(path)[0]
+        rows = []
+        for variant, width in sorted(IMAGE_VARIANTS.items(), key=lambda item: item[1]):
+            resized = image.copy()
+            # thumbnail() shrinks to fit the box and keeps the proportions
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for image_format in ('webp', fallback):
+                variant_path = f"{base}-{variant}.{'jpg' if image_format == 'jpeg' else image_format}"
+                options = {'quality': IMAGE_QUALITY}
+                if image_format == 'jpeg':
+                    options.update(optimize=True, progressive=True)
+                elif image_format == 'png':
+                    options = {'optimize': True}
+                # Save under a temporary name, then rename, so nobody sees a half-written file.
+                # mkstemp picks a name no other process is using, so two workers making
+                # the same copy at once can't write into the same file.
+                full_path = os.path.join(static_folder, variant_path)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.part')
+                try:
+                    with os.fdopen(fd, 'wb') as out:
+                        resized.save(out, image_format.upper(), **options)
+                    os.replace(temp_path, full_path)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                rows.append((sha256, variant, image_format, resized.width, resized.height, variant_path,
+                             os.path.getsize(os.path.join(static_folder, variant_path))))
+            if width >= image.width:
+                break  # the original is no wider than this, so bigger sizes would be copies
+        
+        with conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO image_variants (sha256, variant, format, width, height, path, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+    except Exception as e:
+        # A broken image shouldn't stop the worker; pages keep showing the original
+        print(f"Could not make variants of {path}: {e}")
+        return 0
+    finally:
+        conn.close()
+
+# Background workers for make_image_variants(), started on first use
+image_workers = None
+image_jobs = {}  # sha256: job still waiting or running, so one image isn't resized twice at once
+image_workers_lock = threading.Lock()
+
+def queue_image_variants(sha256, path):
+    """Ask a background worker to make the variants of an image (needs Pillow)."""
+    global image_workers
+    if Image is None:
+        return None
+    with image_workers_lock:
+        if image_workers is None:
+            image_workers = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image-variants')
+        job = image_jobs.get(sha256)
+        if job is not None and not job.done():
+            return job
+        job = image_workers.submit(make_image_variants, sha256, path)
+        image_jobs[sha256] = job
+    # Outside the lock: if the job is already finished, the callback runs right here
+    job.add_done_callback(lambda finished: forget_image_job(sha256, finished))
+    return job
+
+def forget_image_job(sha256, job):
+    """Remove a finished job from image_jobs."""
+    with image_workers_lock:
+        if image_jobs.get(sha256) is job:
+            del image_jobs[sha256]
+
+def queue_missing_variants():
+    """Queue every stored image that has no variants yet (for example, older uploads)."""
+    conn = get_db_connection()
+    blobs = conn.execute("""
+        SELECT b.sha256, b.path FROM image_blobs b
+        WHERE NOT EXISTS (SELECT 1 FROM image_variants v WHERE v.sha256 = b.sha256)
+    """).fetchall()
+    conn.close()
+    return [queue_image_variants(blob['sha256'], blob['path']) for blob in blobs]
+
+def get_image_variants(conn, posts):
+    """Return {post_id: {'webp': [...], 'jpeg' or 'png': [...]}} for the posts' featured images.
+    
+    Each list holds (width, path) pairs from narrowest to widest, ready for srcset.
+    Posts whose variants aren't ready yet are left out and show the original image.
+    """
+    post_ids = [post['id'] for post in posts if post['featured_image']]
+    variants = {}
+    # SQLite limits how many ? a query may have, so ask about 500 posts at a time
+    for start in range(0, len(post_ids), 500):
+        chunk = post_ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(f"""
+            SELECT pi.post_id, v.format, v.width, v.path
+            FROM post_images pi
+            JOIN image_variants v ON v.sha256 = pi.sha256
+            WHERE pi.post_id IN ({placeholders})
+            ORDER BY v.width
+        """, chunk).fetchall()
+        for row in rows:
+            variants.setdefault(row['post_id'], {}).setdefault(row['format'], []).append((row['width'], row['path']))
+    return variants
+
 def create_slug(title):
     """Convert a title to a URL-friendly slug."""
     # Convert to lowercase and replace spaces with hyphens
@@ -287,6 +627,223 @@ def format_content(content):
     
     return '\n'.join(formatted_paragraphs)
 
+class PostHTMLCache:
+    """
+    A small in-memory cache of rendered post HTML, keeping the most recently read posts.
+    
+    How it works:
+    - An OrderedDict keeps the post ids in the order they were last read.
+    - get() moves a post to the end, so the least recently read post is always first.
+    - When the cache is full, set() throws away that first (oldest) post.
+    - Each entry remembers the updated_at it was rendered for. If the post has been
+      changed since, get() treats it as missing, so we never show old HTML.
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # Flask can handle several requests at once, so only one may change the cache at a time.
+        self._lock = threading.Lock()
+    
+    def get(self, post_id, updated_at):
+        """Return the cached HTML for this version of the post, or None."""
+        with self._lock:
+            entry = self._data.get(post_id)
+            if entry is None or entry[0] != updated_at:
+                self.misses += 1
+                return None
+            self._data.move_to_end(post_id)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, post_id, updated_at, html):
+        """Remember html for this version of the post, dropping the oldest post if full."""
+        with self._lock:
+            self._data[post_id] = (updated_at, html)
+            self._data.move_to_end(post_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, post_id):
+        """Forget a post (used when it is deleted)."""
+        with self._lock:
+            self._data.pop(post_id, None)
+
+post_html_cache = PostHTMLCache(POST_HTML_CACHE_SIZE)
+
+class ViewCounter:
+    """
+    Counts post views in memory and writes them to the database in batches.
+    
+    How it works:
+    - add() just adds 1 to a dictionary of {post_id: views not saved yet}, so a page
+      view never waits for the database.
+    - A background thread calls flush() every flush_interval seconds, or sooner when
+      flush_threshold views are waiting. flush() swaps in an empty dictionary and writes
+      all the counts in ONE transaction: view_count = view_count + (views since last time).
+    - If the write fails (for example, the database is busy), the counts are put back
+      and tried again next time, so no views are lost.
+    - stop() runs when Python exits (atexit) and writes whatever is left.
+      Only a hard kill (like kill -9) can lose the last few seconds of views.
+    """
+    
+    def __init__(self, flush_interval, flush_threshold):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = {}
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        # Only one flush at a time (the background thread and stop() could overlap)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+    
+    def add(self, post_id):
+        """Count one view of a post."""
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + 1
+            self._pending_total += 1
+            # Start the background thread on the first view (not at import time, so
+            # scripts that import app.py don't get a thread they never use)
+            if self._thread is None and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name="view-counter", daemon=True)
+                self._thread.start()
+            if self._pending_total >= self.flush_threshold:
+                self._wake.set()
+    
+    def pending(self, post_id):
+        """Return how many views of a post haven't been written to the database yet."""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+    
+    def flush(self):
+        """Write all waiting views to the database. Returns how many views were written."""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._pending = self._pending, {}
+                self._pending_total = 0
+            if not counts:
+                return 0
+            
+            conn = get_db_connection()
+            try:
+                with conn:  # one transaction: commit on success, roll back on error
+                    conn.executemany(
+                        "UPDATE posts SET view_count = view_count + ? WHERE id = ?",
+                        [(views, post_id) for post_id, views in counts.items()]
+                    )
+            except sqlite3.Error as e:
+                print(f"Could not save view counts, will retry: {e}")
+                # Put the counts back so the next flush tries again
+                with self._lock:
+                    for post_id, views in counts.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + views
+                        self._pending_total += views
+                return 0
+            finally:
+                conn.close()
+            return sum(counts.values())
+    
+    def _run(self):
+        """Background thread: flush every flush_interval seconds (or when woken early)."""
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+    
+    def stop(self):
+        """Stop the background thread and write the views that are still waiting."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL, VIEW_FLUSH_THRESHOLD)
+# Save the last views when the app shuts down
+atexit.register(view_counter.stop)
+
+def save_post_html(conn, post_id, content, updated_at):
+    """Render a post's content and save the HTML for its current updated_at.
+    
+    Call this whenever a post is written. The caller commits.
+    """
+    html = format_content(content)
+    conn.execute("""
+        INSERT INTO post_html (post_id, updated_at, renderer_version, html)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (post_id) DO UPDATE SET
+            updated_at = excluded.updated_at,
+            renderer_version = excluded.renderer_version,
+            html = excluded.html
+    """, (post_id, updated_at, RENDERER_VERSION, html))
+    post_html_cache.set(post_id, updated_at, html)
+    return html
+
+def get_post_html(conn, post):
+    """Return a post's HTML: from memory, else from post_html, else render it now.
+    
+    post must include id, content and updated_at. Posts saved before this cache existed
+    (or with an older renderer) are rendered on their first view and saved for next time.
+    """
+    html = post_html_cache.get(post['id'], post['updated_at'])
+    if html is not None:
+        return html
+    
+    row = conn.execute(
+        "SELECT html FROM post_html WHERE post_id = ? AND updated_at IS ? AND renderer_version = ?",
+        (post['id'], post['updated_at'], RENDERER_VERSION)
+    ).fetchone()
+    if row:
+        post_html_cache.set(post['id'], post['updated_at'], row['html'])
+        return row['html']
+    
+    html = save_post_html(conn, post['id'], post['content'], post['updated_at'])
+    conn.commit()
+    return html
+
+def build_comment_tree(comments):
+    """Turn a flat list of comments into a tree of replies, any number of levels deep.
+    
+    Every comment becomes a dictionary with a 'replies' list. We first file each
+    comment under its id, then hang each one under its parent, so the whole tree
+    takes one pass over the list (O(n)) instead of one database query per comment.
+    Replies whose parent isn't in the list (for example, not approved) are left out.
+    """
+    nodes = {}
+    for comment in comments:
+        node = dict(comment)
+        node['replies'] = []
+        nodes[node['id']] = node
+    
+    top_level = []
+    for node in nodes.values():
+        if node['parent_id'] is None:
+            top_level.append(node)
+        elif node['parent_id'] in nodes:
+            nodes[node['parent_id']]['replies'].append(node)
+    return top_level
+
+def flatten_comments(tree):
+    """Put a tree from build_comment_tree() in the order the page shows it.
+    
+    Returns a list of (comment, depth) pairs, where depth is 1 for top-level
+    comments, 2 for their replies, and so on. Each reply comes right after the
+    comment it answers. Uses a list as a to-do stack instead of recursion (in
+    Python or in the template), so very deep threads can't hit Python's recursion limit.
+    """
+    rows = []
+    # Reversed, so the oldest comment comes off the end of the stack first
+    to_visit = [(comment, 1) for comment in reversed(tree)]
+    while to_visit:
+        comment, depth = to_visit.pop()
+        rows.append((comment, depth))
+        to_visit.extend((reply, depth + 1) for reply in reversed(comment['replies']))
+    return rows
+
 # Routes
 @app.route('/')
 def index():
@@ -328,11 +885,15 @@ def index():
         LIMIT 10
     """).fetchall()
     
+    # Smaller copies of the featured images, for srcset
+    images = get_image_variants(conn, list(featured_posts) + list(recent_posts))
+    
     conn.close()
     
     return render_template('index.html', 
                          featured_posts=featured_posts, 
                          recent_posts=recent_posts,
+                         images=images,
                          categories=categories,
                          tags=tags)
 
@@ -436,10 +997,14 @@ def posts():
     categories = conn.execute("SELECT * FROM categories ORDER BY name").fetchall()
     tags = conn.execute("SELECT * FROM tags ORDER BY name").fetchall()
     
+    # Smaller copies of the featured images, for srcset
+    images = get_image_variants(conn, posts)
+    
     conn.close()
     
     return render_template('posts.html', 
                          posts=posts, 
+                         images=images,
                          categories=categories, 
                          tags=tags,
                          current_category=category_filter,
@@ -470,6 +1035,8 @@ def new_post():
             flash('Title and content are required', 'error')
             return redirect(url_for('new_post'))
         
+        conn = get_db_connection()
+        
         # Handle image upload
         featured_image = None
         if 'featured_image' in request.files:
@@ -479,25 +1046,21 @@ def new_post():
                     # Validate the image file
                     is_valid, message = validate_image_file(file)
                     if not is_valid:
+                        conn.close()
                         flash(message, 'error')
                         return redirect(url_for('new_post'))
                     
-                    # Secure the filename and create unique name
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f"{timestamp}_{filename}"
-                    
-                    # Save the file
-                    filepath = os.path.join(UPLOAD_FOLDER, filename)
-                    file.save(filepath)
-                    featured_image = f"uploads/{filename}"
+                    # Save the file under its content hash (identical images are stored once).
+                    # validate_image_file() already checked the extension, so take it from the
+                    # original name (secure_filename('фото.png') would drop the dot entirely).
+                    extension = file.filename.rsplit('.', 1)[1].lower()
+                    image_hash, featured_image, _ = store_upload(conn, file.stream, extension)
                     
                 except Exception as e:
+                    conn.close()
                     flash(f'Error uploading image: {str(e)}', 'error')
                     return redirect(url_for('new_post'))
         
-        conn = get_db_connection()
-        
         # Create slug from title
         slug = create_slug(title)
         
@@ -509,6 +1072,14 @@ def new_post():
         
         post_id = cursor.lastrowid
         
+        # Link the post to its stored image
+        if featured_image:
+            add_post_image(conn, post_id, image_hash)
+        
+        # Render the content to HTML now, so readers never have to wait for it
+        updated_at = conn.execute("SELECT updated_at FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+        save_post_html(conn, post_id, content, updated_at)
+        
         # Handle tags
         if tags_input:
             tag_names = [tag.strip() for tag in tags_input.split(',') if tag.strip()]
@@ -523,6 +1094,10 @@ def new_post():
         conn.commit()
         conn.close()
         
+        # Make the smaller copies of the image in the background, so saving stays fast
+        if featured_image:
+            queue_image_variants(image_hash, featured_image)
+        
         # Show appropriate message based on action
         if action == 'published':
             flash('Post published successfully!', 'success')
@@ -559,8 +1134,10 @@ def view_post(slug):
         flash('Post not found', 'error')
         return redirect(url_for('posts'))
     
-    # Increment view count
-    conn.execute("UPDATE posts SET view_count = view_count + 1 WHERE id = ?", (post['id'],))
+    # Count this view in memory; view_counter saves it to the database in the background
+    view_counter.add(post['id'])
+    # Show the saved count plus the views that haven't been saved yet
+    view_count = post['view_count'] + view_counter.pending(post['id'])
     
     # Get post tags
     tags = conn.execute("""
@@ -569,31 +1146,16 @@ def view_post(slug):
         WHERE pt.post_id = ?
     """, (post['id'],)).fetchall()
     
-    # Get approved comments
+    # Get all approved comments and replies in ONE query (oldest first),
+    # then arrange them into a tree in Python
     comments = conn.execute("""
         SELECT c.*, u.username, u.avatar
         FROM comments c
         JOIN users u ON c.user_id = u.id
-        WHERE c.post_id = ? AND c.is_approved = 1 AND c.parent_id IS NULL
-        ORDER BY c.created_at ASC
+        WHERE c.post_id = ? AND c.is_approved = 1
+        ORDER BY c.created_at ASC, c.id ASC
     """, (post['id'],)).fetchall()
-    
-    # Convert sqlite3.Row objects to dictionaries and get replies for each comment
-    comments_list = []
-    for comment in comments:
-        comment_dict = dict(comment)
-        replies = conn.execute("""
-            SELECT c.*, u.username, u.avatar
-            FROM comments c
-            JOIN users u ON c.user_id = u.id
-            WHERE c.parent_id = ? AND c.is_approved = 1
-            ORDER BY c.created_at ASC
-        """, (comment_dict['id'],)).fetchall()
-        
-        # Convert replies to dictionaries too
-        replies_list = [dict(reply) for reply in replies]
-        comment_dict['replies'] = replies_list
-        comments_list.append(comment_dict)
+    comment_rows = flatten_comments(build_comment_tree(comments))
     
     # Get related posts (same category)
     related_posts = conn.execute("""
@@ -605,16 +1167,21 @@ def view_post(slug):
         LIMIT 3
     """, (post['category_id'], post['id'])).fetchall()
     
-    conn.commit()
-    conn.close()
+    # Get the content as HTML (usually already rendered and cached)
+    formatted_content = get_post_html(conn, post)
+    
+    # Smaller copies of the featured image, for srcset
+    images = get_image_variants(conn, [post])
     
-    # Format the content for display
-    formatted_content = format_content(post['content'])
+    conn.close()
     
     return render_template('view_post.html', 
                          post=post, 
                          tags=tags, 
-                         comments=comments_list,
+                         comment_rows=comment_rows,
+                         comment_count=len(comment_rows),
+                         view_count=view_count,
+                         images=images,
                          related_posts=related_posts,
                          formatted_content=formatted_content)
 
@@ -641,6 +1208,18 @@ def add_comment(slug):
         flash('Post not found', 'error')
         return redirect(url_for('posts'))
     
+    # A reply must answer a comment on the same post
+    if parent_id:
+        parent = conn.execute(
+            "SELECT id FROM comments WHERE id = ? AND post_id = ?", (parent_id, post['id'])
+        ).fetchone()
+        if not parent:
+            conn.close()
+            flash('The comment you replied to no longer exists', 'error')
+            return redirect(url_for('view_post', slug=slug))
+    else:
+        parent_id = None
+    
     # Insert the comment
     conn.execute("""
         INSERT INTO comments (post_id, user_id, parent_id, content) 
@@ -720,10 +1299,20 @@ def delete_post(slug):
     # Delete post tags
     conn.execute("DELETE FROM post_tags WHERE post_id = ?", (post['id'],))
     
+    # Delete the saved HTML
+    conn.execute("DELETE FROM post_html WHERE post_id = ?", (post['id'],))
+    post_html_cache.delete(post['id'])
+    
+    # Stop using its images (the trigger lowers each image's ref_count)
+    conn.execute("DELETE FROM post_images WHERE post_id = ?", (post['id'],))
+    
     # Delete the post
     conn.execute("DELETE FROM posts WHERE id = ?", (post['id'],))
     
     conn.commit()
+    
+    # Delete image files no other post uses
+    delete_unused_images(conn)
     conn.close()
     
     flash('Post deleted successfully!', 'success')
@@ -782,5 +1371,16 @@ if __name__ == '__main__':
     # Run database migration to add new columns
     migrate_database()
     
+    # Make any image variants that are missing (uploads from before they existed).
+    # With debug=True, Flask's reloader runs this file twice: a parent process that
+    # watches for code changes, and a child (with WERKZEUG_RUN_MAIN set) that serves
+    # the pages. Only the child does the work, so the images aren't resized twice.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        queue_missing_variants()
+    
+    # atexit (which saves the last view counts) only runs on a normal exit,
+    # so treat a polite "kill" (SIGTERM) as a normal exit too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     # Start the Flask development server
     app.run(debug=True, host='0.0.0.0', port=5000)
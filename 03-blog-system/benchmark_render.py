@@ -0,0 +1,114 @@
+"""
+benchmark_render.py: Measure how much time the post HTML cache saves.
+
+What it does:
+1. Builds fake Markdown posts of a few sizes (1 KB, 10 KB and 100 KB by default),
+   with headers, **bold** and *italic* text like real posts.
+2. Times three ways of getting a post's HTML, many times each:
+   - render:  calling format_content() every time (what view_post() used to do)
+   - saved:   reading the saved HTML from the post_html table (memory cache is cold)
+   - memory:  getting it from the in-memory PostHTMLCache (a hot post)
+3. Prints the average time per call in microseconds, and how many times faster
+   each cached path is than rendering.
+
+How to run:
+    python benchmark_render.py
+    python benchmark_render.py --sizes 1000 50000 --repeat 500
+
+The data goes into a temporary database, so your real blog.db is left alone.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import app as blog_app
+
+# Words used to build the fake posts.
+WORDS = (
+    "flask python blog post student code database template route request "
+    "learn build test page simple fast small large example project lesson"
+).split()
+
+
+def fake_post(rng, size):
+    """Return Markdown-style text of about size characters."""
+    paragraphs = []
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+        # Sprinkle in some formatting so every regex has work to do
+        words[rng.randrange(len(words))] = f"**{rng.choice(WORDS)}**"
+        words[rng.randrange(len(words))] = f"*{rng.choice(WORDS)}*"
+        paragraph = " ".join(words)
+        if rng.random() < 0.2:
+            paragraph = rng.choice(("# ", "## ", "### ")) + " ".join(words[:4])
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def time_calls(function, repeat):
+    """Call function repeat times and return the average seconds per call."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def measure(conn, post_id, repeat):
+    """Return the average seconds per call for the render, saved and memory paths."""
+    post = conn.execute("SELECT id, content, updated_at FROM posts WHERE id = ?", (post_id,)).fetchone()
+
+    def render():
+        blog_app.format_content(post["content"])
+
+    def saved():
+        # Empty the memory cache first, so the HTML has to come from the database
+        blog_app.post_html_cache.delete(post_id)
+        blog_app.get_post_html(conn, post)
+
+    def memory():
+        blog_app.get_post_html(conn, post)
+
+    # Save the HTML once before timing, like new_post() does
+    blog_app.get_post_html(conn, post)
+    return {
+        "render": time_calls(render, repeat),
+        "saved": time_calls(saved, repeat),
+        "memory": time_calls(memory, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rendering post HTML with reading it from the cache.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="post sizes in characters (default: 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per measurement (default: 200)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, so runs are repeatable")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        blog_app.DB_NAME = os.path.join(folder, "benchmark.db")
+        blog_app.init_database()
+        conn = blog_app.get_db_connection()
+
+        print(f"  {'size':>8} {'render us':>12} {'saved us':>12} {'memory us':>12} {'saved x':>9} {'memory x':>9}")
+        for size in args.sizes:
+            cursor = conn.execute(
+                "INSERT INTO posts (title, content, slug, author_id) VALUES (?, ?, ?, 1)",
+                (f"Benchmark {size}", fake_post(rng, size), f"benchmark-{size}"),
+            )
+            conn.commit()
+            result = measure(conn, cursor.lastrowid, args.repeat)
+            render, saved, memory = (result[name] * 1_000_000 for name in ("render", "saved", "memory"))
+            print(f"  {size:>8,} {render:>12.1f} {saved:>12.1f} {memory:>12.2f} "
+                  f"{render / saved:>8.1f}x {render / memory:>8.0f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
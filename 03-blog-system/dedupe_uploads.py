@@ -0,0 +1,106 @@
+"""
+dedupe_uploads.py: Move old uploads into the content-addressed image store.
+
+Before the image store existed, every upload was saved as
+static/uploads/<timestamp>_<name>, so uploading the same screenshot five times
+kept five copies. This script moves those files into the store used by
+store_upload() (static/uploads/ab/cd/<sha256>.<ext>), where identical files
+share one copy.
+
+For each file directly inside static/uploads:
+1. Hash it and store it (if the same bytes are already stored, nothing is copied).
+2. Point every post that used the old name at the stored file, and record the
+   post in post_images (which raises the image's ref_count).
+3. Delete the old file.
+
+Files that no post uses are only listed, unless you pass --delete-unused.
+
+How to run:
+    python dedupe_uploads.py --dry-run         # show what would happen
+    python dedupe_uploads.py
+    python dedupe_uploads.py --delete-unused   # also delete files no post uses
+    python dedupe_uploads.py --db other.db
+"""
+
+import argparse
+import hashlib
+import os
+
+import app as blog_app
+
+
+def file_hash(path):
+    """Return the SHA-256 hash of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(blog_app.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def old_uploads():
+    """Return the names of the files saved the old way (directly in the uploads folder)."""
+    names = []
+    for name in sorted(os.listdir(blog_app.UPLOAD_FOLDER)):
+        path = os.path.join(blog_app.UPLOAD_FOLDER, name)
+        if os.path.isfile(path) and not name.endswith(".part") and blog_app.allowed_file(name):
+            names.append(name)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old uploads into the deduplicated image store.")
+    parser.add_argument("--db", default=blog_app.DB_NAME, help=f"database file (default: {blog_app.DB_NAME})")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would happen")
+    parser.add_argument("--delete-unused", action="store_true", help="also delete files no post uses")
+    args = parser.parse_args()
+
+    blog_app.DB_NAME = args.db
+    blog_app.init_database()
+    conn = blog_app.get_db_connection()
+
+    names = old_uploads()
+    bytes_before = sum(os.path.getsize(os.path.join(blog_app.UPLOAD_FOLDER, name)) for name in names)
+    bytes_freed = 0
+    hashes = set()
+
+    for name in names:
+        old_path = os.path.join(blog_app.UPLOAD_FOLDER, name)
+        old_image = f"uploads/{name}"
+        size = os.path.getsize(old_path)
+        posts = conn.execute("SELECT id FROM posts WHERE featured_image = ?", (old_image,)).fetchall()
+        sha256 = file_hash(old_path)
+        duplicate = sha256 in hashes or conn.execute(
+            "SELECT 1 FROM image_blobs WHERE sha256 = ?", (sha256,)
+        ).fetchone() is not None
+        hashes.add(sha256)
+
+        if not posts and not args.delete_unused:
+            print(f"unused (kept): {name}")
+            continue
+        if not posts:
+            print(f"unused (deleted): {name}")
+        else:
+            print(f"{'duplicate' if duplicate else 'stored'}: {name} -> {sha256[:12]}... ({len(posts)} post(s))")
+        if duplicate or not posts:
+            bytes_freed += size
+        if args.dry_run:
+            continue
+
+        if posts:
+            with open(old_path, "rb") as f:
+                sha256, new_image, size = blog_app.store_upload(conn, f, name.rsplit(".", 1)[1].lower())
+            for post in posts:
+                conn.execute("UPDATE posts SET featured_image = ? WHERE id = ?", (new_image, post["id"]))
+                blog_app.add_post_image(conn, post["id"], sha256)
+            # Save the new paths before removing the old file
+            conn.commit()
+        os.remove(old_path)
+
+    conn.close()
+    action = "Would free" if args.dry_run else "Freed"
+    print(f"\n{len(names)} old file(s), {bytes_before:,} bytes. {action} {bytes_freed:,} bytes.")
+
+
+if __name__ == "__main__":
+    main()
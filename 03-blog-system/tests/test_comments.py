@@ -0,0 +1,64 @@
+"""
+Tests for the comments on a post's page.
+
+Run from the 03-blog-system folder:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+# Let the tests import app.py from the folder above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as blog_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client for the blog, using a fresh database in a temporary folder."""
+    monkeypatch.setattr(blog_app, 'DB_NAME', str(tmp_path / 'test.db'))
+    blog_app.init_database()
+    blog_app.migrate_database()
+    conn = blog_app.get_db_connection()
+    conn.execute("INSERT INTO posts (title, content, slug, author_id) VALUES ('Deep', 'Hello', 'deep', 1)")
+    conn.commit()
+    conn.close()
+
+    client = blog_app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1  # the default admin user
+    yield client
+    # Save the counted views now, while DB_NAME still points at the test database
+    blog_app.view_counter.flush()
+
+
+def test_very_deep_reply_chain(client):
+    # Each comment replies to the one before, deeper than Python's recursion limit
+    depth = sys.getrecursionlimit() + 100
+    parent_id = ''
+    conn = blog_app.get_db_connection()
+    for number in range(depth):
+        client.post('/posts/deep/comment', data={'content': f'reply {number}', 'parent_id': parent_id})
+        parent_id = str(conn.execute("SELECT MAX(id) FROM comments").fetchone()[0])
+    conn.close()
+
+    response = client.get('/posts/deep')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert f'Comments ({depth})' in html
+    # Replies are shown in thread order, right after the comment they answer
+    assert html.index('>reply 0<') < html.index('>reply 1<') < html.index(f'>reply {depth - 1}<')
+
+
+def test_flatten_comments_order():
+    comments = [
+        {'id': 1, 'parent_id': None},
+        {'id': 2, 'parent_id': None},
+        {'id': 3, 'parent_id': 1},
+        {'id': 4, 'parent_id': 3},
+        {'id': 5, 'parent_id': 1},
+    ]
+    rows = blog_app.flatten_comments(blog_app.build_comment_tree(comments))
+    assert [(comment['id'], depth) for comment, depth in rows] == [(1, 1), (3, 2), (4, 3), (5, 2), (2, 1)]